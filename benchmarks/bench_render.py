@@ -0,0 +1,328 @@
+"""
+Scaling benchmark for `Reporter.render` on synthetic workflows.
+
+Builds fake DAG and job objects with a configurable number of jobs, files
+per job, parameters per file and conda environments, renders a report for
+each size in a temporary directory and records the wall time and memory of
+every phase. Runs offline with the bundled context and a stub extractor.
+
+    python benchmarks/bench_render.py --jobs 1000 10000 100000 --output results.json
+    python benchmarks/bench_render.py --jobs 1000 --compare benchmarks/baseline.json
+
+With `--compare`, the exit code is 1 if any size is slower than the baseline
+by more than `--threshold`. Times are compared relative to a fixed
+calibration workload, so baselines carry over between machines.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import wraps
+from pathlib import Path
+from types import SimpleNamespace
+
+from snakemake_report_plugin_metadat4ing import (
+    BUNDLED_CONTEXT,
+    Reporter,
+    ReportSettings,
+)
+
+# Reporter methods timed as phases of `render`, in the order they run.
+PHASES = {
+    "context": "_get_context",
+    "index": "_index_dag_jobs",
+    "sources": "_add_ro_crate_sources",
+    "metadata": "_collect_file_metadata",
+    "extraction": "_extract_all_params",
+    "jobs": "_create_job_node",
+    "crate_nodes": "_add_ro_crate_file_nodes",
+    "zip": "_create_ro_crate_file",
+}
+
+STUB_EXTRACTOR = """
+import re
+from snakemake_report_plugin_metadat4ing.interfaces import (
+    ParameterExtractorInterface,
+)
+
+
+class StubExtractor(ParameterExtractorInterface):
+    def extract_params(self, rule_name, file_path):
+        index = int(re.search(r"\\d+", file_path).group())
+        return {{
+            f"param_{{i}}": {{
+                "value": (index + i) % {distinct_values},
+                "unit": "units:M",
+                "json-path": f"/param_{{i}}",
+                "data-type": "schema:Float",
+            }}
+            for i in range({params_per_file})
+        }}
+
+    def extract_tools(self, rule_name, env_file_content):
+        return {{env_file_content.decode().split()[-1]: "1.0"}}
+"""
+
+
+class FakeDAGJob:
+    def __init__(self, jobid, rule, input, output, conda_env):
+        self.jobid = jobid
+        self.rule = SimpleNamespace(name=rule)
+        self.input = input
+        self.output = output
+        self.conda_env = conda_env
+        self.shellcmd = f"python3 {rule}.py {jobid}"
+
+    def __str__(self):
+        return self.rule.name
+
+
+class FakeDAG:
+    def __init__(self, jobs):
+        self.jobs = jobs
+
+    def toposorted(self):
+        levels = {}
+        for job in self.jobs:
+            levels.setdefault(job.rule.name, job)
+        return [[job] for job in levels.values()]
+
+
+def build_workflow(workdir, n_jobs, files_per_job, n_rules, n_envs):
+    """
+    Create a chain of jobs in `workdir`, where every job reads the outputs
+    of the previous one and writes `files_per_job` new files.
+    """
+    envs = [SimpleNamespace(content=f"- tool_{i}".encode()) for i in range(n_envs)]
+    rules = [f"rule_{i}" for i in range(n_rules)]
+    for rule in rules:
+        (workdir / f"{rule}.py").write_text("")
+    (workdir / "Snakefile").write_text("")
+
+    dag_jobs, records, previous = [], [], []
+    for jobid in range(n_jobs):
+        rule = rules[jobid % n_rules]
+        output = [f"file_{jobid}_{i}.json" for i in range(files_per_job)]
+        for name in output:
+            (workdir / name).write_text(f'{{"job": {jobid}}}')
+        dag_job = FakeDAGJob(jobid, rule, previous, output, envs[jobid % n_envs])
+        dag_jobs.append(dag_job)
+        records.append(
+            SimpleNamespace(
+                job=dag_job,
+                rule=rule,
+                starttime=1_700_000_000 + jobid,
+                endtime=1_700_000_001 + jobid,
+                output=output,
+            )
+        )
+        previous = output
+    return FakeDAG(dag_jobs), records
+
+
+class PhaseRecorder:
+    """
+    Accumulate the wall time of the wrapped methods and, if memory is traced,
+    their peak traced memory and the memory still allocated after their last
+    call.
+    """
+
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+        self.peak = 0
+        self.phases = {name: {"seconds": 0.0, "calls": 0} for name in PHASES}
+
+    def wrap(self, reporter):
+        for name, method in PHASES.items():
+            setattr(reporter, method, self._timed(name, getattr(reporter, method)))
+
+    def _timed(self, name, func):
+        phase = self.phases[name]
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            if self.trace_memory:
+                # Keep the overall peak before resetting it for this phase.
+                self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                phase["seconds"] += time.perf_counter() - start
+                phase["calls"] += 1
+                if self.trace_memory:
+                    current, peak = tracemalloc.get_traced_memory()
+                    phase["peak_bytes"] = max(phase.get("peak_bytes", 0), peak)
+                    phase["retained_bytes"] = current
+
+        return timed
+
+
+def run(n_jobs, args):
+    with tempfile.TemporaryDirectory(prefix="metadat4ing-bench-") as tmp:
+        tmp = Path(tmp)
+        workdir = tmp / "work"
+        workdir.mkdir()
+        script = tmp / "stub_extractor.py"
+        script.write_text(
+            STUB_EXTRACTOR.format(
+                params_per_file=args.params_per_file,
+                distinct_values=args.distinct_values,
+            )
+        )
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            dag, records = build_workflow(
+                workdir, n_jobs, args.files_per_job, args.rules, args.envs
+            )
+            reporter = Reporter(
+                rules={},
+                results={},
+                configfiles=[],
+                jobs=records,
+                settings=ReportSettings(
+                    paramscript=script,
+                    context=BUNDLED_CONTEXT,
+                    cachedir=tmp / "cache",
+                    workers=args.workers,
+                ),
+                workflow_description="",
+                dag=dag,
+            )
+            recorder = PhaseRecorder(args.memory)
+            recorder.wrap(reporter)
+            if args.memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            reporter.render()
+            total = time.perf_counter() - start
+            peak = (
+                max(recorder.peak, tracemalloc.get_traced_memory()[1])
+                if args.memory
+                else None
+            )
+            tracemalloc.stop()
+            crate = workdir / f"ro-crate-metadata-{reporter.simulation_hash}.zip"
+            crate_size = crate.stat().st_size
+        finally:
+            os.chdir(cwd)
+    result = {
+        "jobs": n_jobs,
+        "seconds": total,
+        "crate_bytes": crate_size,
+        "max_rss_bytes": _max_rss(),
+        "phases": recorder.phases,
+    }
+    if peak is not None:
+        result["peak_bytes"] = peak
+    return result
+
+
+def calibrate(repeat=5):
+    """Time a fixed pure Python workload, the unit of the normalized times."""
+    data = [{"@id": f"local:node_{i}", "value": i * 0.5} for i in range(20_000)]
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for node in data:
+            json.dumps(node, sort_keys=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _max_rss():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def compare(results, baseline, threshold):
+    """Return the sizes whose normalized time exceeds the baseline by more than `threshold`."""
+    reference = {run["jobs"]: run["normalized"] for run in baseline["results"]}
+    regressions = []
+    for run in results["results"]:
+        expected = reference.get(run["jobs"])
+        if expected is None:
+            continue
+        ratio = run["normalized"] / expected
+        print(f"{run['jobs']:>8} jobs: {ratio:.2f}x baseline")
+        if ratio > 1 + threshold:
+            regressions.append(run["jobs"])
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--files-per-job", type=int, default=2)
+    parser.add_argument("--params-per-file", type=int, default=5)
+    parser.add_argument(
+        "--distinct-values",
+        type=int,
+        default=50,
+        help="Number of distinct values per parameter, which controls deduplication.",
+    )
+    parser.add_argument("--rules", type=int, default=4)
+    parser.add_argument(
+        "--envs", type=int, default=2, help="Number of conda envs shared by the jobs."
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="Trace the peak memory of every phase. Slows down the run.",
+    )
+    parser.add_argument("--output", type=Path, help="Write the results as JSON.")
+    parser.add_argument(
+        "--compare", type=Path, help="Baseline results to compare with."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.5,
+        help="Allowed slowdown relative to the baseline, e.g. 0.5 for 50%%.",
+    )
+    args = parser.parse_args(argv)
+
+    calibration = calibrate()
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "calibration_seconds": calibration,
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("jobs", "output", "compare", "threshold")
+        },
+        "results": [],
+    }
+    for n_jobs in args.jobs:
+        result = run(n_jobs, args)
+        result["normalized"] = result["seconds"] / calibration
+        results["results"].append(result)
+        phases = ", ".join(
+            f"{name} {phase['seconds']:.2f}s"
+            for name, phase in result["phases"].items()
+        )
+        print(f"{n_jobs:>8} jobs: {result['seconds']:.2f}s ({phases})")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=4))
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regression for {regressions} jobs beyond {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,14 +8,37 @@ import re
 
 class ParameterExtractor(ParameterExtractorInterface):
     def extract_params(self, rule_name: str, file_path: str) -> dict:
+        if not self._is_extracted(rule_name, os.path.basename(file_path)):
+            return {}
+        with open(file_path) as f:
+            data = json.load(f)
+        return self._params_from_data(rule_name, os.path.basename(file_path), data)
+
+    def extract_params_batch(self, items: list) -> dict:
+        # Every JSON file is parsed only once, even if several rules use it.
+        parsed = {}
+        results = {}
+        for rule_name, file_path in items:
+            file_name = os.path.basename(file_path)
+            if not self._is_extracted(rule_name, file_name):
+                results[(rule_name, file_path)] = {}
+                continue
+            if file_path not in parsed:
+                with open(file_path) as f:
+                    parsed[file_path] = json.load(f)
+            results[(rule_name, file_path)] = self._params_from_data(
+                rule_name, file_name, parsed[file_path]
+            )
+        return results
+
+    def _is_extracted(self, rule_name: str, file_name: str) -> bool:
+        return (
+            file_name.startswith("parameters_") and rule_name == "generate_input_files"
+        ) or (file_name.startswith("summary_") and rule_name == "summary")
+
+    def _params_from_data(self, rule_name: str, file_name: str, data: dict) -> dict:
         results = {}
-        file_name = os.path.basename(file_path)
-        if (
-            file_name.startswith("parameters_")
-            and rule_name == "generate_input_files"
-        ):
-            with open(file_path) as f:
-                data = json.load(f)
+        if file_name.startswith("parameters_"):
             for key, val in data.items():
                 if isinstance(val, dict):
                     results[key] = {
@@ -31,12 +54,7 @@ class ParameterExtractor(ParameterExtractorInterface):
                         "json-path": f"/{key}",
                         "data-type": self._get_type(val),
                     }
-        elif (
-            file_name.startswith("summary_")
-            and rule_name == "summary"
-        ):
-            with open(file_path) as f:
-                data = json.load(f)
+        elif file_name.startswith("summary_"):
             for key, val in data.items():
                 if key == "max_mises_stress":
                     results[key] = {
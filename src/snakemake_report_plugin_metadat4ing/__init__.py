@@ -2,10 +2,9 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from fileinput import filename
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 from snakemake_interface_report_plugins.reporter import ReporterBase
 from snakemake_interface_report_plugins.settings import ReportSettingsBase
-from rdflib import Graph
 import requests
 import json
 import importlib.util
@@ -13,19 +12,258 @@ import inspect
 from snakemake_report_plugin_metadat4ing.interfaces import (
     ParameterExtractorInterface,
 )
+from snakemake_report_plugin_metadat4ing.cache import ReportCache
+from snakemake_report_plugin_metadat4ing.crate import CHUNK_SIZE, write_crate_zip
+from snakemake_report_plugin_metadat4ing.formats import (
+    DEFAULT_FORMATS,
+    FORMATS,
+    ProvenanceWriters,
+    encoding_format,
+)
+from snakemake_report_plugin_metadat4ing.mapping import (
+    MAPPING_SUFFIXES,
+    MappingExtractor,
+)
+from snakemake_report_plugin_metadat4ing.metadata import (
+    map_concurrent,
+    mime_type,
+    stat_file,
+)
+from snakemake_report_plugin_metadat4ing.nodes import (
+    FieldNode,
+    FileNode,
+    JobNode,
+    NodeIds,
+    Parameter,
+    ParamNode,
+    StepNode,
+    ToolNode,
+)
+from snakemake_report_plugin_metadat4ing.profiling import Profiler
+from snakemake_report_plugin_metadat4ing.rdf import RdfConverter
+from snakemake_report_plugin_metadat4ing.shards import ShardedGraph
+from snakemake_report_plugin_metadat4ing.store import ProvenanceStore
 from rocrate.rocrate import ROCrate
 from rocrate.model.softwareapplication import SoftwareApplication
-import mimetypes
 import shlex
+import sqlite3
+from fnmatch import fnmatch
 import os
 import hashlib
+import time
+import cProfile
+import zipfile
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import Counter
+from itertools import repeat
+
+M4I_VERSION = "1.3.1"
+CONTEXT_URL = "https://git.rwth-aachen.de/nfdi4ing/metadata4ing/metadata4ing/-/raw/master/m4i2rocrate_context.jsonld"
+CONTEXT_FILENAME = "m4i2rocrate_context.jsonld"
+CACHE_FILENAME = "cache.sqlite"
+# Parameters are extracted for this many jobs at a time, just before their
+# nodes are built, so only the results of a window are held in memory.
+EXTRACTION_WINDOW = 200
+BUNDLED_CONTEXT = (
+    Path(__file__).parent / "resources" / f"m4i2rocrate_context-{M4I_VERSION}.jsonld"
+)
+
 
 @dataclass
 class ReportSettings(ReportSettingsBase):
     paramscript: Optional[Path] = field(
         default=None,
         metadata={
-            "help": "Path to external Python script which implements the ParameterExtractorInterface.",
+            "help": "Path to external Python script which implements the ParameterExtractorInterface, or to a YAML or JSON mapping of rules and files to parameters.",
+            "env_var": False,
+            "required": False,
+            "parse_func": Path,
+            "unparse_func": str,
+        },
+    )
+    context: Optional[Path] = field(
+        default=None,
+        metadata={
+            "help": "Path to a metadata4ing JSON-LD context file to use instead of the cached or bundled one.",
+            "env_var": False,
+            "required": False,
+            "parse_func": Path,
+            "unparse_func": str,
+        },
+    )
+    context_online: bool = field(
+        default=False,
+        metadata={
+            "help": "Allow revalidating the cached metadata4ing context against the remote server.",
+            "env_var": False,
+            "required": False,
+        },
+    )
+    context_timeout: float = field(
+        default=5.0,
+        metadata={
+            "help": "Timeout in seconds for fetching the metadata4ing context.",
+            "env_var": False,
+            "required": False,
+        },
+    )
+    workers: int = field(
+        default=1,
+        metadata={
+            "help": "Number of workers used to run the parameter extractor in parallel.",
+            "env_var": False,
+            "required": False,
+        },
+    )
+    worker_type: str = field(
+        default="thread",
+        metadata={
+            "help": "Run the parameter extractor in a thread or a process pool. Use processes for CPU-bound extractors.",
+            "env_var": False,
+            "required": False,
+            "choices": ["thread", "process"],
+        },
+    )
+    compact: bool = field(
+        default=False,
+        metadata={
+            "help": "Write provenance.jsonld without indentation.",
+            "env_var": False,
+            "required": False,
+        },
+    )
+    formats: Optional[List[str]] = field(
+        default=None,
+        metadata={
+            "help": "Formats of the provenance graph: jsonld, ttl (Turtle), nt (N-Triples) and/or nq (N-Quads). Defaults to jsonld and ttl.",
+            "env_var": False,
+            "required": False,
+            "nargs": "+",
+            "parse_func": list,
+            "unparse_func": list,
+            "choices": list(FORMATS),
+        },
+    )
+    gzip: bool = field(
+        default=False,
+        metadata={
+            "help": "Gzip-compress the provenance files, e.g. provenance.nt.gz.",
+            "env_var": False,
+            "required": False,
+        },
+    )
+    compression_level: int = field(
+        default=6,
+        metadata={
+            "help": "Deflate level (0-9) for compressible files in the RO-Crate, such as text and JSON. Other files are always stored uncompressed. 0 disables compression.",
+            "env_var": False,
+            "required": False,
+        },
+    )
+    checksum_workers: int = field(
+        default=4,
+        metadata={
+            "help": "Number of threads used to compute the sha256 checksums of files.",
+            "env_var": False,
+            "required": False,
+        },
+    )
+    metadata_concurrency: int = field(
+        default=32,
+        metadata={
+            "help": "Number of files whose metadata (size, modification time, MIME type, real path) is collected concurrently.",
+            "env_var": False,
+            "required": False,
+        },
+    )
+    reference_size: Optional[int] = field(
+        default=None,
+        metadata={
+            "help": "Add files larger than this many bytes to the RO-Crate as references only, without their content.",
+            "env_var": False,
+            "required": False,
+            "type": int,
+        },
+    )
+    reference_glob: Optional[List[str]] = field(
+        default=None,
+        metadata={
+            "help": "Glob patterns of files that are added to the RO-Crate as references only, without their content.",
+            "env_var": False,
+            "required": False,
+            "nargs": "+",
+            "parse_func": list,
+            "unparse_func": list,
+        },
+    )
+    param_cache_size: int = field(
+        default=256 * 1024 * 1024,
+        metadata={
+            "help": "Maximum size in bytes of the persistent cache of extracted parameters. The least recently used results are evicted first. 0 disables the cache.",
+            "env_var": False,
+            "required": False,
+        },
+    )
+    incremental: bool = field(
+        default=False,
+        metadata={
+            "help": "Keep a report state with the extracted parameters of every job and only rerun the parameter extractor for jobs that changed since the last report.",
+            "env_var": False,
+            "required": False,
+        },
+    )
+    shard: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Split the provenance graph into self-contained documents per rule or per --report-metadat4ing-shard-jobs jobs, with an index document, instead of a single provenance.jsonld and provenance.ttl.",
+            "env_var": False,
+            "required": False,
+            "choices": ["rule", "jobs"],
+        },
+    )
+    shard_jobs: int = field(
+        default=1000,
+        metadata={
+            "help": "Number of jobs per provenance document with --report-metadat4ing-shard jobs.",
+            "env_var": False,
+            "required": False,
+        },
+    )
+    store: Optional[Path] = field(
+        default=None,
+        metadata={
+            "help": "Also add the steps, jobs, files, parameters and fields of the report to this SQLite database, which collects the provenance of many runs for queries.",
+            "env_var": False,
+            "required": False,
+            "parse_func": Path,
+            "unparse_func": str,
+        },
+    )
+    profile: Optional[Path] = field(
+        default=None,
+        metadata={
+            "help": "Write a timing summary of the report phases, extractor calls per rule and output sizes to this JSON file, and print it as a table.",
+            "env_var": False,
+            "required": False,
+            "parse_func": Path,
+            "unparse_func": str,
+        },
+    )
+    profile_cprofile: Optional[Path] = field(
+        default=None,
+        metadata={
+            "help": "Run the report under cProfile and dump the statistics to this file.",
+            "env_var": False,
+            "required": False,
+            "parse_func": Path,
+            "unparse_func": str,
+        },
+    )
+    cachedir: Optional[Path] = field(
+        default=None,
+        metadata={
+            "help": "Directory for persistent caches. Defaults to the user cache directory.",
             "env_var": False,
             "required": False,
             "parse_func": Path,
@@ -33,305 +271,938 @@ class ReportSettings(ReportSettingsBase):
         },
     )
 
+    def __post_init__(self):
+        if self.shard_jobs is not None and self.shard_jobs < 1:
+            raise ValueError("--report-metadat4ing-shard-jobs must be at least 1.")
+
+
+def _load_extractor_class(script_path):
+    spec = importlib.util.spec_from_file_location("extractor_module", script_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    extractor_class = None
+    for _, obj in inspect.getmembers(module, inspect.isclass):
+        if (
+            issubclass(obj, ParameterExtractorInterface)
+            and obj is not ParameterExtractorInterface
+        ):
+            extractor_class = obj
+            break
+    if extractor_class is None:
+        raise ImportError("No subclass of ParameterExtractorInterface found in script")
+
+    return extractor_class
+
+
+def _load_extractor(path):
+    """Return an extractor for a Python script or a declarative mapping file."""
+    if Path(path).suffix in MAPPING_SUFFIXES:
+        return MappingExtractor.from_file(path)
+    return _load_extractor_class(path)()
+
+
+_worker_extractor = None
+
+
+def _init_extraction_worker(script_path):
+    global _worker_extractor
+    _worker_extractor = _load_extractor(script_path)
+
+
+def _call_extractor_in_worker(method, *args):
+    return getattr(_worker_extractor, method)(*args)
+
+
+def _timed_call_extractor_in_worker(method, *args):
+    start = time.perf_counter()
+    result = getattr(_worker_extractor, method)(*args)
+    return result, time.perf_counter() - start
+
+
+def _timed(func):
+    def timed(*args):
+        start = time.perf_counter()
+        result = func(*args)
+        return result, time.perf_counter() - start
+
+    return timed
+
 
 class Reporter(ReporterBase):
     def __post_init__(self):
         self.context_data = {}
+        self.extractor = None
+        self.extractor_hash = None
+        self.extractor_stat = None
+        self.profiler = Profiler()
 
     def render(self):
-        self._get_context()
+        self.profiler = Profiler(self.settings.profile is not None)
+        profile = cProfile.Profile() if self.settings.profile_cprofile else None
+        if profile:
+            profile.enable()
+        self.extraction_pool = None
+        try:
+            with self._open_cache() as self.cache:
+                self._render()
+        finally:
+            if self.extraction_pool is not None:
+                self.extraction_pool.shutdown()
+            if profile:
+                profile.disable()
+                profile.dump_stats(self.settings.profile_cprofile)
+        if self.profiler.enabled:
+            self.profiler.write(self.settings.profile)
+            print(self.profiler.table())
+
+    def _render(self):
+        with self.profiler.phase("context"):
+            self._get_context()
         self.param_counter = 0
         self.field_counter = 0
-        self.param_dict = {}
+        self.param_index = {}
+        self.node_ids = NodeIds()
         self.conda_envs_dict = {}
         self.tool_counter = 0
         self.tools_dict = {}
         self.crate = ROCrate()
         self.simulation_hash = ""
-        self.provenance_filename = "provenance.jsonld"
-        self.provenance_ttl_filename = "provenance.ttl"
+        self.provenance_basename = "provenance"
+        with self.profiler.phase("dag_scan"):
+            self.job_index = self._index_dag_jobs()
+        with self.profiler.phase("sources"):
+            self._add_ro_crate_sources()
 
-        jsonld = {
-            "@context": self.context_data.get("@context", {}),
-            "@graph": [],
-        }
-        jsonld["@context"]["units"] = "http://qudt.org/vocab/unit/"
+        context = self.context_data.get("@context", {})
+        context["units"] = "http://qudt.org/vocab/unit/"
 
         sorted_jobs = sorted(self.jobs, key=lambda job: job.starttime)
-        job_nodes, step_nodes, file_nodes, field_nodes = {}, {}, {}, {}
-        file_counter = 0
-        
-        toposorted = self.dag.toposorted()
-        
-        for i, steps in enumerate(toposorted):
-            for step in steps:
-                step_nodes[f"{step}"] = {
-                    "@id": f"local:{step}",
-                    "@type": "processing step",
-                    "label": f"{step}",
-                    "schema:position": i,
-                }
-        
-        for job in sorted_jobs:
-            job_label = f"{job.rule}_{job.job.jobid}"
-            step_node = self._create_job_node(
-                job, step_nodes, file_nodes, field_nodes, file_counter
-            )
-            job_nodes[job_label] = step_node
-            file_counter = len(file_nodes)
-
-        for key, value in self.param_dict.items():
-            value["@id"] = key
-
-        for d in (
-            step_nodes,
-            job_nodes,
-            file_nodes,
-            self.param_dict,
-            field_nodes,
-            self.tools_dict,
-        ):
-            jsonld["@graph"].extend(d.values())
-
-        self.simulation_hash = self._random_hash_from_json(jsonld,16)
-        jsonld["@context"]["local"] = f"https://local-domain.org/{self.simulation_hash}/"
-            
-        with open("provenance.jsonld", "w", encoding="utf8") as f:
-            json.dump(jsonld, f, indent=4, ensure_ascii=False)
-        
-        self._create_ttl_from_jsonld(jsonld)
-        self._add_ro_crate_file_nodes(file_nodes)
-        # self._add_ro_crate_software()
-        self._create_ro_crate_file()
-        
-        os.remove(self.provenance_filename)
-        os.remove(self.provenance_ttl_filename)
-   
-    def _create_job_node(
-        self, job, main_steps_dict, files_dict, fields_dict, file_counter
-    ):
-        node = {
-            "@id": f"local:processing_step_{job.job.jobid}",
-            "@type": "processing step",
-            "label": f"{job.rule}_{job.job.jobid}",
-            "part of": {"@id": main_steps_dict[job.rule]["@id"]},
-            "start time": f"{datetime.fromtimestamp(job.starttime)}",
-            "end time": f"{datetime.fromtimestamp(job.endtime)}",
-            "has input": [],
-            "has output": [],
-            "has parameter": [],
-            "has employed tool": [],
-        }
+        step_nodes, file_nodes = {}, {}
 
-        input_files = [
-            f
-            for j in self.dag.jobs
-            if j.jobid == job.job.jobid
-            for f in j.input
-        ]
+        with self.profiler.phase("metadata"):
+            self.file_info = self._collect_file_metadata(sorted_jobs)
+            self.checksums = {
+                file: (info.size, info.sha256)
+                for file, info in self.file_info.items()
+                if info.exists
+            }
+        self.extracted_params = {}
+        self.param_uses = Counter()
+        if self.settings.paramscript:
+            # Each result is released after the last job that uses it.
+            self.param_uses.update(
+                (job.rule, file) for job in sorted_jobs for file in self._job_files(job)
+            )
+            if self.settings.incremental:
+                # The report state covers all jobs, so it is extracted at once.
+                with self.profiler.phase("extraction"):
+                    self._keep_extracted(self._extract_incremental(sorted_jobs))
+        extract_windows = self.settings.paramscript and not self.settings.incremental
 
-        conda_files = [
-            j.conda_env for j in self.dag.jobs if j.jobid == job.job.jobid
-        ]
-        
-        shell_cmds = [
-            j.shellcmd for j in self.dag.jobs if j.jobid == job.job.jobid and j.shellcmd
-        ]
-        
-        for shell_cmd_file in shell_cmds:
-            shell_file = self._extract_script(shell_cmd_file)
-            if shell_file:
-                _ = self.crate.add_file(
-                    shell_file,
-                    dest_path=shell_file,
-                    properties={
-                        "name": shell_file,
-                        "encodingFormat": self._get_mime_type(shell_file),
-                    },
+        converter = RdfConverter(context, Path.cwd().as_uri() + "/")
+        sections = ("steps", "jobs", "files", "params", "fields", "tools")
+        formats = tuple(dict.fromkeys(self.settings.formats or DEFAULT_FORMATS))
+        with ExitStack() as stack:
+            # With shards, the whole graph is only needed for the hash.
+            self.writers = stack.enter_context(
+                ProvenanceWriters(
+                    () if self.settings.shard else formats,
+                    sections,
+                    converter,
+                    compact=self.settings.compact,
+                    hashed=True,
+                    profiler=self.profiler,
+                )
             )
-            
-        for conda_file in conda_files:
-            if (
-                self.settings.paramscript
-                and conda_file
-                and conda_file not in self.conda_envs_dict
-            ):
-                tools = self._extract_tools(job.rule, conda_file.content)
-                for tool in tools:
-                    node["has employed tool"].append({"@id": tool["@id"]})
+            self.shards = None
+            if self.settings.shard:
+                self.shards = stack.enter_context(
+                    ShardedGraph(
+                        self.settings.shard,
+                        self.settings.shard_jobs,
+                        formats,
+                        sections,
+                        converter,
+                        self.node_ids,
+                        compact=self.settings.compact,
+                        gzip=self.settings.gzip,
+                    )
+                )
+            self.store = None
+            if self.settings.store:
+                self.store = stack.enter_context(ProvenanceStore(self.settings.store))
+                self.store.begin_run(str(Path.cwd()))
+            toposorted = self.dag.toposorted()
+
+            for i, steps in enumerate(toposorted):
+                for step in steps:
+                    step_nodes[f"{step}"] = StepNode(
+                        self.node_ids.add(f"local:{step}"), f"{step}", i
+                    )
+            for step_node in step_nodes.values():
+                self._add_node("steps", step_node)
+
+            with self.profiler.phase("jobs"):
+                for start in range(0, len(sorted_jobs), EXTRACTION_WINDOW):
+                    window = sorted_jobs[start : start + EXTRACTION_WINDOW]
+                    if extract_windows:
+                        with self.profiler.phase("extraction"):
+                            self._keep_extracted(self._extract_all_params(window))
+                    for job in window:
+                        if self.shards:
+                            self.shards.start_job(job.rule)
+                        step_node = self._create_job_node(job, step_nodes, file_nodes)
+                        self._add_node("jobs", step_node)
+
+            with self.profiler.phase("hash"):
+                self.simulation_hash = self.writers.hexdigest(context)[:16]
+            context["local"] = f"https://local-domain.org/{self.simulation_hash}/"
+
+            with self.profiler.phase("crate_entities"):
+                provenance_files = self._provenance_files()
+                references = self._add_ro_crate_file_nodes(file_nodes, provenance_files)
+            # self._add_ro_crate_software()
+            # The provenance files are streamed straight into the crate.
+            with self.profiler.phase("zip"):
+                crate_file = self._create_ro_crate_file(
+                    {**self._provenance_members(context), **dict.fromkeys(references)}
+                )
+            if self.store:
+                with self.profiler.phase("store"):
+                    self.store.finish(self.simulation_hash, crate_file.resolve())
+            if self.profiler.enabled:
+                self._profile_crate_files(crate_file, provenance_files)
+
+    def _provenance_files(self) -> dict:
+        """Return the names of the provenance files with their formats."""
+        if self.shards:
+            return self.shards.filenames()
+        return self.writers.filenames(self.provenance_basename, self.settings.gzip)
+
+    def _provenance_members(self, context) -> dict:
+        """Return the functions streaming each provenance file into the crate."""
+        if self.shards:
+            return self.shards.members(context, self.settings.compression_level)
+        return self.writers.members(
+            self.provenance_basename,
+            context,
+            self.settings.gzip,
+            self.settings.compression_level,
+        )
+
+    def _create_job_node(self, job, main_steps_dict, files_dict):
+        node = JobNode(
+            f"local:processing_step_{job.job.jobid}",
+            f"{job.rule}_{job.job.jobid}",
+            main_steps_dict[job.rule].ref,
+            f"{datetime.fromtimestamp(job.starttime)}",
+            f"{datetime.fromtimestamp(job.endtime)}",
+        )
+
+        dag_job = self.job_index.get(job.job.jobid, {})
+        input_files = dag_job.get("input", [])
+        conda_file = dag_job.get("conda_env")
+        if dag_job.get("script") in self.scripts:
+            node.script = dag_job["script"]
+
+        if self.settings.paramscript and conda_file:
+            tools = self._extract_tools(job.rule, conda_file.content)
+            for tool in tools:
+                node.tools.append(tool.ref)
 
         for file in input_files:
             if not self.is_file(file):
                 continue
-            file_node, file_counter = self._add_file(
-                file, files_dict, file_counter
-            )
-            node["has input"].append({"@id": file_node["@id"]})
+            file_ref = self._add_file(file, files_dict)
+            node.inputs.append(file_ref)
             if self.settings.paramscript:
-                param_id_list, field_nodes = self._extract_parameters(
-                    job.rule, file, file_node
+                param_refs, field_nodes = self._extract_parameters(
+                    job.rule, file, file_ref
                 )
-                fields_dict.update(field_nodes)
-                for param in param_id_list:
-                    node["has parameter"].append({"@id": param})
+                for field_node in field_nodes:
+                    self._add_node("fields", field_node)
+                node.parameters.extend(param_refs)
 
         for file in job.output:
             if not self.is_file(file):
                 continue
-            file_node, file_counter = self._add_file(
-                file, files_dict, file_counter
-            )
-            node["has output"].append({"@id": file_node["@id"]})
+            file_ref = self._add_file(file, files_dict)
+            node.outputs.append(file_ref)
             if self.settings.paramscript:
-                param_id_list, field_nodes = self._extract_parameters(
-                    job.rule, file, file_node
+                param_refs, field_nodes = self._extract_parameters(
+                    job.rule, file, file_ref
                 )
-                fields_dict.update(field_nodes)
-        snakefile, snakepath = self._find_snakefile()
-        
-        if snakefile:
+                for field_node in field_nodes:
+                    self._add_node("fields", field_node)
+        return node
+
+    def _add_node(self, section, node):
+        """Materialize a node and write it to the provenance graphs."""
+        data = node.to_dict(self.node_ids)
+        self.writers.add(section, data)
+        if self.shards:
+            with self.profiler.phase("shard_nodes"):
+                self.shards.add(section, node, data)
+        if self.store:
+            with self.profiler.phase("store"):
+                self.store.add(section, node, self.node_ids)
+
+    def _index_dag_jobs(self):
+        """
+        Index the DAG jobs by jobid in a single pass, so that the per-job
+        lookups in `_create_job_node` are constant time instead of a scan
+        over `self.dag.jobs`. The same pass resolves the script of every job
+        and collects the Snakefiles of the workflow into `self.snakefiles`.
+        """
+        index = {}
+        self.snakefiles = {}
+        workflows = set()
+        for j in self.dag.jobs:
+            index[j.jobid] = {
+                "input": list(j.input),
+                "conda_env": j.conda_env,
+                "script": self._job_script(j),
+            }
+            workflow = getattr(j.rule, "workflow", None)
+            if workflow is not None and id(workflow) not in workflows:
+                workflows.add(id(workflow))
+                for source in workflow.included:
+                    self._add_snakefile(source.get_path_or_uri(secret_free=True))
+        if not self.snakefiles:
+            snakefile = self._find_snakefile()
+            if snakefile:
+                self.snakefiles[snakefile[1]] = snakefile[0]
+        return index
+
+    def _job_script(self, dag_job):
+        """
+        Return the path of the script run by a job, relative to the working
+        directory: the `script:` of its rule, or the script invoked by its
+        shell command. Returns None if there is none.
+        """
+        script = getattr(dag_job.rule, "script", None)
+        if script and "{" not in script:
+            basedir = getattr(dag_job.rule, "basedir", None)
+            if basedir is not None and not os.path.isabs(script):
+                script = os.path.join(basedir.get_path_or_uri(secret_free=True), script)
+            return os.path.relpath(script)
+        if dag_job.shellcmd:
+            return self._extract_script(dag_job.shellcmd)
+        return None
+
+    def _add_snakefile(self, path):
+        if os.path.isfile(path):
+            rel_path = os.path.relpath(path)
+            if not rel_path.startswith(os.pardir):
+                self.snakefiles[rel_path] = os.path.basename(rel_path)
+
+    def _add_ro_crate_sources(self):
+        """
+        Add the Snakefiles and the scripts of all jobs to the crate, each
+        exactly once. The script of a job is in `self.job_index`; the scripts
+        added are kept in `self.scripts`, for the jobs to refer to them.
+        """
+        self.scripts = set()
+        for path, name in self.snakefiles.items():
             _ = self.crate.add_file(
-                    snakefile,
-                    dest_path=snakepath,
-                    properties={
-                        "name": snakefile,
-                        "encodingFormat": "text/plain",
-                    },
+                path,
+                dest_path=path,
+                properties={
+                    "name": name,
+                    "encodingFormat": "text/plain",
+                },
+            )
+        scripts = dict.fromkeys(
+            job["script"] for job in self.job_index.values() if job["script"]
+        )
+        for script in scripts:
+            if not os.path.isfile(script) or script in self.snakefiles:
+                continue
+            # Scripts outside the working directory would escape the crate.
+            if os.path.isabs(script) or os.path.relpath(script).startswith(os.pardir):
+                continue
+            self.scripts.add(script)
+            _ = self.crate.add_file(
+                script,
+                dest_path=script,
+                properties={
+                    "name": script,
+                    "encodingFormat": self._get_mime_type(script),
+                },
             )
-            
-        return node
 
-    def _add_file(self, file_path, file_dict, counter):
+    def _job_files(self, job):
+        """Return the input and output files of a job that become file nodes."""
+        dag_job = self.job_index.get(job.job.jobid, {})
+        return [
+            str(file)
+            for file in [*dag_job.get("input", []), *job.output]
+            if self.is_file(file)
+        ]
+
+    def _add_file(self, file_path, file_dict):
+        """Return the reference of a file node, adding the node on first use."""
+        file_path = str(file_path)
         if file_path not in file_dict:
-            file_dict[file_path] = {
-                "@id": file_path,
-                "@type": "cr:FileObject",
-                "label": file_path,
-            }
-            counter += 1
-        return file_dict[file_path], counter
+            file_dict[file_path] = self.node_ids.add(file_path)
+            self._add_node(
+                "files",
+                FileNode(file_dict[file_path], self.checksums.get(file_path)),
+            )
+        return file_dict[file_path]
 
-    def _extract_parameters(self, rule, file, file_node):
-        param_id_list = []
-        field_dict = {}
-        extract_params_obj = self._load_param_extractor_obj()
-        params = extract_params_obj.extract_params(rule, file)
-        if params:
-            params = self._validate_extract_param_output(params)
-            for name, data in params.items():
-                name = name.replace("-", "_")
-                param_id = ""
-                param = {
-                    "@type": (
-                        "text variable"
-                        if data["data-type"] == "schema:Text"
-                        else "numerical variable"
-                    ),
-                    "label": name,
-                }
-                if data["data-type"] == "schema:Text":
-                    param["has string value"] = data["value"]
-                else:
-                    param["has numerical value"] = data["value"]
-                    if data["unit"]:
-                        param["has unit"] = {"@id": data["unit"]}
-
-                if param in self.param_dict.values():
-                    param_id = next(
-                        (k for k, v in self.param_dict.items() if v == param),
-                        None,
-                    )
-                    param_id_list.append(param_id)
-                else:
-                    param_id = f"local:variable_{name}_{self.param_counter}"
-                    self.param_dict[param_id] = param
-                    self.param_counter += 1
-
-                field_dict[f"{name}_{self.field_counter}"] = {
-                    "@id": f"local:field_{name}_{self.field_counter}",
-                    "@type": "Field",
-                    "represents": {"@id": param_id},
-                    "source": {
-                        "file object": {"@id": file_node["@id"]},
-                        "cr:extract": {"cr:jsonPath": data["json-path"]},
-                    },
-                    **(
-                        {"cr:dataType": data["data-type"]}
-                        if data["data-type"]
-                        else {}
-                    ),
-                }
-                self.field_counter += 1
-        return param_id_list, field_dict
+    def _extract_parameters(self, rule, file, file_ref):
+        param_refs = []
+        field_nodes = []
+        task = (rule, str(file))
+        if task in self.extracted_params:
+            params = self.extracted_params[task]
+            self.param_uses[task] -= 1
+            if not self.param_uses[task]:
+                del self.extracted_params[task], self.param_uses[task]
+        else:
+            params = self._to_parameters(
+                self._load_param_extractor_obj().extract_params(rule, file)
+            )
+        for param in params:
+            name = param.name
+            is_text = param.data_type == "schema:Text"
+            unit = None if is_text else param.unit or None
+            # Equal exactly when the materialized parameter nodes are equal.
+            param_key = (is_text, name, self._param_key(param.value), unit)
+            if param_key in self.param_index:
+                param_ref = self.param_index[param_key]
+                param_refs.append(param_ref)
+            else:
+                param_ref = self.node_ids.add(
+                    f"local:variable_{name}_{self.param_counter}"
+                )
+                self._add_node(
+                    "params",
+                    ParamNode(param_ref, name, param.value, unit, is_text),
+                )
+                self.param_index[param_key] = param_ref
+                self.param_counter += 1
+
+            field_nodes.append(
+                FieldNode(
+                    f"local:field_{name}_{self.field_counter}",
+                    param_ref,
+                    file_ref,
+                    param.json_path,
+                    param.data_type,
+                )
+            )
+            self.field_counter += 1
+        return param_refs, field_nodes
+
+    def _to_parameters(self, params):
+        """
+        Validate the output of `extract_params` and convert it to a tuple of
+        slotted `Parameter`s, which are kept until the job's nodes are built.
+        """
+        if not params:
+            return ()
+        params = self._validate_extract_param_output(params)
+        return tuple(
+            Parameter(
+                name.replace("-", "_"),
+                self._canonical_value(data["value"]),
+                data["unit"],
+                data["json-path"],
+                data["data-type"],
+            )
+            for name, data in params.items()
+        )
+
+    def _canonical_value(self, value):
+        """
+        Return a parameter value as it reads back from JSON, e.g. tuples as
+        lists. Results from the param cache and the report state went
+        through JSON, so fresh results must match them to be deduplicated
+        alike.
+        """
+        if not isinstance(value, (list, tuple, dict)):
+            return value
+        try:
+            return json.loads(json.dumps(value))
+        except (TypeError, ValueError):
+            # Not JSON serializable, so never cached either.
+            return value
+
+    def _extract_all_params(self, jobs):
+        """
+        Run the parameter extractor for every distinct (rule, file) pair of
+        the given jobs that is not extracted yet. Extractors implementing
+        `extract_params_batch` get the pairs in one batch per worker. The
+        results are keyed by pair; ids, counters and deduplication are
+        assigned afterwards in job order, so the output does not depend on
+        the number of workers or the window size.
+        """
+        return self._run_extractor(
+            [
+                task
+                for task in dict.fromkeys(
+                    (job.rule, file) for job in jobs for file in self._job_files(job)
+                )
+                if task not in self.extracted_params
+            ]
+        )
+
+    def _keep_extracted(self, results):
+        """Keep extracted results as `Parameter`s until their last job is built."""
+        for task, params in results.items():
+            self.extracted_params[task] = self._to_parameters(params)
+
+    def _run_extractor(self, tasks):
+        """
+        Run the extractor for a list of (rule, file) pairs, keyed by pair.
+
+        Validated results are kept in the persistent cache, keyed by rule,
+        absolute path, sha256 of the file and hash of the extractor script,
+        so they are reused until the file or the script changes.
+        """
+        if not tasks or not self.settings.param_cache_size:
+            return self._call_extractor(tasks)
+
+        self._load_param_extractor_obj()
+        keys = {
+            (rule, file): (
+                rule,
+                os.path.abspath(file),
+                self.checksums[file][1],
+                self.extractor_hash,
+            )
+            for rule, file in tasks
+            if file in self.checksums
+        }
+        cached = self.cache.get_params(keys.values())
+        results = {task: cached[key] for task, key in keys.items() if key in cached}
+        extracted = self._call_extractor(
+            [task for task in tasks if task not in results]
+        )
+        for params in extracted.values():
+            if params:
+                self._validate_extract_param_output(params)
+        self.cache.set_params(
+            {keys[task]: params for task, params in extracted.items() if task in keys}
+        )
+        results.update(extracted)
+        return {task: results[task] for task in tasks}
+
+    def _call_extractor(self, tasks):
+        if not tasks:
+            return {}
+
+        extractor = self._load_param_extractor_obj()
+        if (
+            type(extractor).extract_params_batch
+            is ParameterExtractorInterface.extract_params_batch
+        ):
+            rules = [rule for rule, _ in tasks]
+            files = [file for _, file in tasks]
+            results = self._map_extractor("extract_params", rules, files)
+            return dict(zip(tasks, results))
+
+        workers = max(1, min(self.settings.workers, len(tasks)))
+        size = -(-len(tasks) // workers)
+        chunks = [tasks[i : i + size] for i in range(0, len(tasks), size)]
+        results = {}
+        for chunk_results in self._map_extractor("extract_params_batch", chunks):
+            results.update(chunk_results)
+        return {task: results.get(task) for task in tasks}
+
+    def _extract_incremental(self, jobs):
+        """
+        Like `_extract_all_params`, but reuse the results of the previous
+        report for every job whose fingerprint did not change.
+
+        The report state maps job fingerprints to the extracted parameters of
+        the job's files. Only the extraction results are reused: all nodes, ids
+        and the simulation hash are built from them exactly as in a full
+        report, so the output is identical.
+        """
+        state_file = self._report_state_file()
+        try:
+            state = json.loads(state_file.read_text(encoding="utf8"))["jobs"]
+        except (OSError, ValueError, KeyError):
+            state = {}
+
+        fingerprints, results = {}, {}
+        for job in jobs:
+            fingerprint = self._job_fingerprint(job)
+            fingerprints[job.job.jobid] = fingerprint
+            for file, params in state.get(fingerprint, []):
+                results[(job.rule, file)] = params
+        pending = [
+            task
+            for task in dict.fromkeys(
+                (job.rule, file) for job in jobs for file in self._job_files(job)
+            )
+            if task not in results
+        ]
+        results.update(self._run_extractor(pending))
+
+        new_state = {
+            fingerprints[job.job.jobid]: [
+                [file, results[(job.rule, file)]] for file in self._job_files(job)
+            ]
+            for job in jobs
+        }
+        try:
+            content = json.dumps({"jobs": new_state})
+        except (TypeError, ValueError) as e:
+            print(f"Failed to save the report state: {e}")
+        else:
+            self._write_cache_file(state_file, content)
+        return results
+
+    def _report_state_file(self) -> Path:
+        """Return the report state file of the current working directory."""
+        workdir_hash = hashlib.sha256(os.getcwd().encode("utf8")).hexdigest()
+        return self._cache_dir() / "report-state" / f"{workdir_hash[:16]}.json"
+
+    def _job_fingerprint(self, job) -> str:
+        """
+        Hash everything the extracted parameters of a job depend on: its rule,
+        inputs and outputs, the size, mtime and inode of its files and the
+        content of the extractor script.
+        """
+        dag_job = self.job_index.get(job.job.jobid, {})
+        stats = []
+        for file in self._job_files(job):
+            info = self.file_info[file]
+            if info.exists:
+                stats.append([file, info.size, info.mtime_ns, info.inode])
+            else:
+                stats.append([file, None])
+        self._load_param_extractor_obj()
+        fingerprint = [
+            job.rule,
+            [str(file) for file in dag_job.get("input", [])],
+            [str(file) for file in job.output],
+            stats,
+            self.extractor_hash,
+        ]
+        return hashlib.sha256(json.dumps(fingerprint).encode("utf8")).hexdigest()
+
+    def _collect_file_metadata(self, jobs):
+        """
+        Return the `FileInfo` of every file of the given jobs, gathered before
+        the graph is built, with the sha256 of every existing file.
+
+        The files are stat'ed concurrently, on up to `metadata_concurrency`
+        threads. Checksums are memoized in the persistent cache, keyed by the
+        absolute path, size, mtime and inode of the file, so unchanged files
+        are never read again. All other files are hashed concurrently on up
+        to `checksum_workers` threads.
+        """
+        files = list(
+            dict.fromkeys(file for job in jobs for file in self._job_files(job))
+        )
+        infos = map_concurrent(stat_file, files, self.settings.metadata_concurrency)
+        file_info, missing = {}, []
+        for file, info in zip(files, infos):
+            file_info[file] = info
+            if not info.exists:
+                continue
+            key = (os.path.abspath(file), info.size, info.mtime_ns, info.inode)
+            info.sha256 = self.cache.get_checksum(*key)
+            if not info.sha256:
+                missing.append((file, key))
+        if not missing:
+            return file_info
+
+        digests = map_concurrent(
+            self._file_sha256,
+            [file for file, _ in missing],
+            self.settings.checksum_workers,
+        )
+        for (file, _), sha256 in zip(missing, digests):
+            file_info[file].sha256 = sha256
+        self.cache.set_checksums(
+            [(*key, sha256) for (_, key), sha256 in zip(missing, digests)]
+        )
+        return file_info
+
+    def _file_sha256(self, path) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _map_extractor(self, method, *iterables):
+        """
+        Map a method of the extractor over the given argument lists on the
+        worker pool configured by `workers` and `worker_type`. When profiling,
+        the time of every call is added to the extractor time of its rule.
+        """
+        if not self.profiler.enabled:
+            return self._map_extractor_calls(method, False, *iterables)
+        timed_results = self._map_extractor_calls(method, True, *iterables)
+        for args, (_, seconds) in zip(zip(*iterables), timed_results):
+            if method == "extract_params_batch":
+                # The time of a batch is split evenly over its items.
+                for rule, _ in args[0]:
+                    self.profiler.add_extractor_time(rule, seconds / len(args[0]))
+            else:
+                self.profiler.add_extractor_time(args[0], seconds)
+        return [result for result, _ in timed_results]
+
+    def _map_extractor_calls(self, method, timed, *iterables):
+        workers = min(self.settings.workers, len(iterables[0]))
+        if workers <= 1:
+            func = getattr(self._load_param_extractor_obj(), method)
+            return list(map(_timed(func) if timed else func, *iterables))
+        executor = self._extraction_pool()
+        if self.settings.worker_type == "process":
+            return list(
+                executor.map(
+                    _timed_call_extractor_in_worker
+                    if timed
+                    else _call_extractor_in_worker,
+                    repeat(method),
+                    *iterables,
+                    chunksize=max(1, len(iterables[0]) // (workers * 4)),
+                )
+            )
+        func = getattr(self._load_param_extractor_obj(), method)
+        return list(executor.map(_timed(func) if timed else func, *iterables))
+
+    def _extraction_pool(self):
+        """
+        Return the worker pool of the extractor. It is started on first use
+        and shared by all extraction windows of a report.
+        """
+        if self.extraction_pool is None:
+            if self.settings.worker_type == "process":
+                self.extraction_pool = ProcessPoolExecutor(
+                    self.settings.workers,
+                    initializer=_init_extraction_worker,
+                    initargs=(str(self.settings.paramscript),),
+                )
+            else:
+                self.extraction_pool = ThreadPoolExecutor(self.settings.workers)
+        return self.extraction_pool
+
+    def _param_key(self, value):
+        """
+        Return a hashable key for a parameter node which compares equal
+        exactly when the nodes compare equal, so that duplicates can be
+        resolved through `self.param_index`.
+        """
+        if isinstance(value, dict):
+            return frozenset(
+                (key, self._param_key(item)) for key, item in value.items()
+            )
+        if isinstance(value, (list, tuple)):
+            return (type(value), tuple(self._param_key(item) for item in value))
+        if isinstance(value, set):
+            return frozenset(value)
+        return value
 
     def _extract_tools(self, rule, file):
-        tools_list = []
+        """
+        Return the tool nodes of a conda environment.
+
+        The extractor is called once per distinct environment content. Its
+        result is memoized in `conda_envs_dict` and persisted in the cache,
+        keyed by the content hash of the environment and of the extractor
+        script, so jobs sharing an environment reuse the same tool nodes.
+        """
+        content = file.encode("utf8") if isinstance(file, str) else bytes(file)
+        env_hash = hashlib.sha256(content).hexdigest()
+        if env_hash in self.conda_envs_dict:
+            return self.conda_envs_dict[env_hash]
+
         extract_params_obj = self._load_param_extractor_obj()
-        tools = extract_params_obj.extract_tools(rule, file)
-        if tools:
-            tools = self._validate_extract_tools_output(tools)
-            for name, version in tools.items():
-                if name not in self.tools_dict:
-                    item = {
-                        "@id": f"local:tool_{self.tool_counter}",
-                        "@type": "schema:SoftwareApplication",
-                        "label": name,
-                        **(
-                            {"schema:softwareVersion": version}
-                            if version
-                            else {}
-                        ),
-                    }
-                    self.tools_dict[name] = item
-                    self.tool_counter += 1
-                    tools_list.append(item)
-                else:
-                    tools_list.append(self.tools_dict[name])
+        tools = self.cache.get_tools(self.extractor_hash, env_hash)
+        if tools is None:
+            start = time.perf_counter()
+            tools = extract_params_obj.extract_tools(rule, file)
+            self.profiler.add_extractor_time(rule, time.perf_counter() - start)
+            if tools:
+                tools = self._validate_extract_tools_output(tools)
+            self.cache.set_tools(self.extractor_hash, env_hash, tools or {})
+
+        tools_list = []
+        for name, version in (tools or {}).items():
+            if name not in self.tools_dict:
+                item = ToolNode(
+                    self.node_ids.add(f"local:tool_{self.tool_counter}"),
+                    name,
+                    version,
+                )
+                self.tools_dict[name] = item
+                self._add_node("tools", item)
+                self.tool_counter += 1
+                tools_list.append(item)
+            else:
+                tools_list.append(self.tools_dict[name])
+        self.conda_envs_dict[env_hash] = tools_list
         return tools_list
 
     def _get_context(self):
-        # url = "https://git.rwth-aachen.de/nfdi4ing/metadata4ing/metadata4ing/-/raw/master/m4i_context.jsonld"
-        url = "https://git.rwth-aachen.de/nfdi4ing/metadata4ing/metadata4ing/-/raw/master/m4i2rocrate_context.jsonld"
-        response = requests.get(url)
-        if response.ok:
-            self.context_data = response.json()
-        else:
+        """
+        Load the metadata4ing JSON-LD context.
+
+        A context file given by the `context` setting always wins. Otherwise
+        the copy in the cache directory is used, which is only revalidated
+        against the remote server if `context_online` is set. Without a cached
+        copy, the context bundled with the plugin is used.
+        """
+        if self.settings.context:
+            self.context_data = self._read_context(self.settings.context)
+            return
+
+        cache_file = self._cache_dir() / CONTEXT_FILENAME
+        if self.settings.context_online:
+            self._fetch_context(cache_file)
+
+        try:
+            self.context_data = self._read_context(cache_file)
+        except (OSError, ValueError):
+            self.context_data = self._read_context(BUNDLED_CONTEXT)
+
+    def _fetch_context(self, cache_file: Path):
+        """
+        Revalidate the cached context with a conditional request and update
+        the cache if the server returned a new version.
+        """
+        headers_file = cache_file.with_suffix(".headers.json")
+        headers = {}
+        if cache_file.exists() and headers_file.exists():
+            try:
+                cached_headers = json.loads(headers_file.read_text(encoding="utf8"))
+            except (OSError, ValueError):
+                # A corrupt headers file is a cache miss.
+                cached_headers = {}
+            if not isinstance(cached_headers, dict):
+                cached_headers = {}
+            if cached_headers.get("etag"):
+                headers["If-None-Match"] = cached_headers["etag"]
+            if cached_headers.get("last-modified"):
+                headers["If-Modified-Since"] = cached_headers["last-modified"]
+
+        try:
+            response = requests.get(
+                CONTEXT_URL, headers=headers, timeout=self.settings.context_timeout
+            )
+        except requests.RequestException as e:
+            print(f"Failed to fetch context data: {e}")
+            return
+        if response.status_code == 304:
+            return
+        if not response.ok:
             print(
                 f"Failed to fetch context data. Status code: {response.status_code}"
             )
+            return
+        try:
+            context = response.json()
+        except ValueError:
+            print("Failed to fetch context data. Response is not valid JSON.")
+            return
 
-    def _add_ro_crate_file_nodes(self, file_nodes):
-        _ = self.crate.add_file(
-            self.provenance_filename,
-            dest_path=self.provenance_filename,
-            properties={
-                "name": self.provenance_filename,
-                "encodingFormat": "application/ld+json",
-                "conformsTo": [
-                    "https://w3id.org/ro/crate/1.1",
-                    "https://w3id.org/nfdi4ing/metadata4ing/1.3.1",
-                ],
-            },
+        self._write_cache_file(
+            cache_file, json.dumps(context, indent=4, ensure_ascii=False)
         )
-        
-        _ = self.crate.add_file(
-            self.provenance_ttl_filename,
-            dest_path=self.provenance_ttl_filename,
-            properties={
-                "name": self.provenance_ttl_filename,
-                "encodingFormat": "text/turtle",
-            },
+        self._write_cache_file(
+            headers_file,
+            json.dumps(
+                {
+                    "etag": response.headers.get("ETag"),
+                    "last-modified": response.headers.get("Last-Modified"),
+                }
+            ),
         )
-        
+
+    def _read_context(self, path: Path) -> dict:
+        with open(path, encoding="utf8") as f:
+            context = json.load(f)
+        if "@context" not in context:
+            raise ValueError(f"No @context found in {path}")
+        return context
+
+    def _open_cache(self) -> ReportCache:
+        """
+        Open the persistent cache, or an in-memory one if the cache directory
+        is not usable, so that reports never depend on a writable location
+        outside the working directory.
+        """
+        path = self._cache_dir() / CACHE_FILENAME
+        # The extractor results are evicted once, when the report is done.
+        params_size = self.settings.param_cache_size or None
+        try:
+            return ReportCache(path, params_size)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Cannot use the cache {path}, caching in memory only: {e}")
+            return ReportCache()
+
+    def _cache_dir(self) -> Path:
+        if self.settings.cachedir:
+            return Path(self.settings.cachedir)
+        cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+        return Path(cache_home) / "snakemake-report-plugin-metadat4ing"
+
+    def _write_cache_file(self, path: Path, content: str):
+        """Write a cache file atomically, so concurrent reports never see it half written."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(content, encoding="utf8")
+        os.replace(tmp_path, path)
+
+    def _add_ro_crate_file_nodes(self, file_nodes, provenance_files) -> list:
+        """
+        Add the provenance files and the files of the workflow to the crate.
+        Return the files that are only referenced, see `_is_reference`.
+        """
+        references = []
+        for name, fmt in provenance_files.items():
+            properties = {
+                "name": name,
+                "encodingFormat": encoding_format(fmt, name.endswith(".gz")),
+            }
+            if fmt == "jsonld":
+                properties["conformsTo"] = [
+                    "https://w3id.org/ro/crate/1.1",
+                    f"https://w3id.org/nfdi4ing/metadata4ing/{M4I_VERSION}",
+                ]
+            _ = self.crate.add_file(None, dest_path=name, properties=properties)
+
         for file in file_nodes.keys():
-            _ = self.crate.add_file(
-                file,
-                dest_path=file,
-                properties={
-                    "name": file,
-                    "encodingFormat": self._get_mime_type(file),
-                },
-            )
+            info = self.file_info[file]
+            properties = {
+                "name": file,
+                "encodingFormat": info.mime_type,
+            }
+            if str(file) in self.checksums:
+                size, sha256 = self.checksums[str(file)]
+                properties["contentSize"] = str(size)
+                properties["sha256"] = sha256
+            if self._is_reference(file):
+                # Same id as if it was packed, but the crate holds no payload.
+                realpath = Path(info.realpath or Path(file).resolve())
+                properties["contentUrl"] = realpath.as_uri()
+                _ = self.crate.add_file(None, dest_path=file, properties=properties)
+                references.append(file)
+            else:
+                _ = self.crate.add_file(file, dest_path=file, properties=properties)
+        return references
+
+    def _is_reference(self, file) -> bool:
+        """
+        Return whether a file is added to the crate as a reference only,
+        because it matches `reference_glob` or is larger than `reference_size`.
+        """
+        patterns = self.settings.reference_glob or []
+        if any(fnmatch(str(file), pattern) for pattern in patterns):
+            return True
+        if self.settings.reference_size is None or str(file) not in self.checksums:
+            return False
+        return self.checksums[str(file)][0] > self.settings.reference_size
 
     def _add_ro_crate_software(self):
         self.crate.add(SoftwareApplication(self.crate, "Snakemake", {
@@ -339,39 +1210,53 @@ class Reporter(ReporterBase):
             "url": "https://snakemake.readthedocs.io/"
         }))
     
-    def _create_ttl_from_jsonld(self, data: dict):
-        Graph().parse(data=data, format="json-ld").serialize(
-            "provenance.ttl", format="ttl"
-        )
+    def _create_ro_crate_file(self, members):
+        crate_file = Path(f"ro-crate-metadata-{self.simulation_hash}.zip")
+        tmp_file = crate_file.with_name(f".{crate_file.name}.{os.getpid()}.tmp")
+        try:
+            write_crate_zip(
+                self.crate,
+                tmp_file,
+                members,
+                compression_level=self.settings.compression_level,
+            )
+            os.replace(tmp_file, crate_file)
+        finally:
+            tmp_file.unlink(missing_ok=True)
+        return crate_file
 
-    def _create_ro_crate_file(self):
-        self.crate.write_zip(f"ro-crate-metadata-{self.simulation_hash}.zip")
+    def _profile_crate_files(self, crate_file, provenance_files):
+        """Record the sizes of the provenance files and of the crate."""
+        with zipfile.ZipFile(crate_file) as archive:
+            for name in provenance_files:
+                info = archive.getinfo(name)
+                self.profiler.add_file(name, info.file_size, info.compress_size)
+        self.profiler.add_file(str(crate_file), crate_file.stat().st_size)
 
     def _load_param_extractor_obj(self):
+        """
+        Return the extractor instance of the script given by `paramscript`,
+        or a `MappingExtractor` if it is a YAML or JSON mapping.
+
+        The script is imported only once and the instance is reused for all
+        subsequent calls. It is reloaded when the content hash of the script
+        changes, which is only recomputed if its size or mtime changed.
+        """
         script_path = self.settings.paramscript
         if not script_path or not script_path.exists():
             raise FileNotFoundError(f"Script not found: {script_path}")
 
-        spec = importlib.util.spec_from_file_location(
-            "extractor_module", script_path
-        )
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-
-        extractor_class = None
-        for _, obj in inspect.getmembers(module, inspect.isclass):
-            if (
-                issubclass(obj, ParameterExtractorInterface)
-                and obj is not ParameterExtractorInterface
-            ):
-                extractor_class = obj
-                break
-        if extractor_class is None:
-            raise ImportError(
-                "No subclass of ParameterExtractorInterface found in script"
-            )
+        stat = script_path.stat()
+        script_stat = (stat.st_size, stat.st_mtime_ns)
+        if self.extractor is not None and script_stat == self.extractor_stat:
+            return self.extractor
 
-        return extractor_class()
+        script_hash = hashlib.sha256(script_path.read_bytes()).hexdigest()
+        if self.extractor is None or script_hash != self.extractor_hash:
+            self.extractor = _load_extractor(script_path)
+            self.extractor_hash = script_hash
+        self.extractor_stat = script_stat
+        return self.extractor
 
     def _validate_extract_param_output(self, result):
         if not isinstance(result, dict):
@@ -418,46 +1303,56 @@ class Reporter(ReporterBase):
             The detected MIME type, e.g. 'application/pdf'.
             Falls back to 'application/octet-stream' if the type is unknown.
         """
-        # Ensure we’re only passing the name, not a PosixPath object, to mimetypes.
-        file_name = Path(file_name).name
-
-        mime_type, _ = mimetypes.guess_type(file_name, strict=False)
-        return mime_type or "application/octet-stream"
+        return mime_type(file_name)
 
     def _extract_script(self, cmd: str) -> str | None:
-       """
-       Return the script filename from a shell‑command string, or None
-       if no plausible script can be identified.
-       """
-       _INTERPRETERS = {
-            "python", "python3", "python2",
-            "pypy", "pypy3",
-            "ruby", "perl", "node", "deno", "php", "lua",
-            "Rscript", "R", "bash", "sh", "zsh", "ksh", "fish"
+        """
+        Return the path of the script run by a shell command, as written in
+        the command, or None if no plausible script can be identified.
+        """
+        _INTERPRETERS = {
+            "python",
+            "python3",
+            "python2",
+            "pypy",
+            "pypy3",
+            "ruby",
+            "perl",
+            "node",
+            "deno",
+            "php",
+            "lua",
+            "Rscript",
+            "R",
+            "bash",
+            "sh",
+            "zsh",
+            "ksh",
+            "fish",
         }
-       
-       try:
-           tokens = shlex.split(cmd, posix=True)
-       except ValueError: 
-           return None
-
-       if not tokens:
-           return None
-
-       if Path(tokens[0]).name in _INTERPRETERS:
-           for tok in tokens[1:]:
-               if tok.startswith("-"):
-                   continue
-               return Path(tok).name 
-           return None
-
-       first = Path(tokens[0])
-       
-       if first.suffix and first.suffix not in {".exe", ".bat", ".cmd"}:
-           return first.name
-
-       return None
-   
+
+        try:
+            tokens = shlex.split(cmd, posix=True)
+        except ValueError:
+            return None
+
+        if not tokens:
+            return None
+
+        if Path(tokens[0]).name in _INTERPRETERS:
+            for tok in tokens[1:]:
+                if tok.startswith("-"):
+                    continue
+                return os.path.normpath(tok)
+            return None
+
+        first = Path(tokens[0])
+
+        if first.suffix and first.suffix not in {".exe", ".bat", ".cmd"}:
+            return os.path.normpath(tokens[0])
+
+        return None
+
     def _find_snakefile(self):
         current_dir = os.getcwd()
         for file in os.listdir(current_dir):
@@ -472,7 +1367,3 @@ class Reporter(ReporterBase):
             not os.path.isabs(file_name) and              # Not an absolute path
             not any(sep in file_name for sep in ['/', '\\'])  # No separators
         )
-    def _random_hash_from_json(self, json_content: dict, length=8) -> str:
-        json_str = json.dumps(json_content, sort_keys=True).encode('utf-8')
-        hash_value = hashlib.sha256(json_str).hexdigest()
-        return hash_value[:length]
\ No newline at end of file
@@ -0,0 +1,159 @@
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checksums (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tools (
+    extractor_hash TEXT NOT NULL,
+    env_hash TEXT NOT NULL,
+    tools TEXT NOT NULL,
+    PRIMARY KEY (extractor_hash, env_hash)
+);
+CREATE TABLE IF NOT EXISTS params (
+    rule TEXT NOT NULL,
+    path TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    extractor_hash TEXT NOT NULL,
+    params TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (rule, path)
+);
+CREATE INDEX IF NOT EXISTS params_last_used ON params (last_used);
+"""
+
+
+class ReportCache:
+    """
+    Persistent cache of the reporter, shared by all reports of a user.
+
+    It is an SQLite database in the cache directory, so that concurrent
+    reports can safely read and update it. Without a `path`, the cache only
+    lives in memory for a single report. The extractor results are limited
+    to `params_size` bytes when the cache is closed, unless it is None.
+    """
+
+    def __init__(self, path: Optional[Path] = None, params_size: Optional[int] = None):
+        self.params_size = params_size
+        if path is None:
+            self.db = sqlite3.connect(":memory:")
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(path, timeout=60)
+        self.db.executescript(SCHEMA)
+
+    def get_checksum(self, path: str, size: int, mtime_ns: int, inode: int):
+        """Return the cached sha256 of a file, if the file did not change."""
+        row = self.db.execute(
+            "SELECT sha256 FROM checksums "
+            "WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+            (path, size, mtime_ns, inode),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_checksums(self, rows):
+        """Store (path, size, mtime_ns, inode, sha256) rows."""
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO checksums VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def get_tools(self, extractor_hash: str, env_hash: str):
+        """Return the tools an extractor found in a conda environment, if cached."""
+        row = self.db.execute(
+            "SELECT tools FROM tools WHERE extractor_hash = ? AND env_hash = ?",
+            (extractor_hash, env_hash),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_tools(self, extractor_hash: str, env_hash: str, tools: dict):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO tools VALUES (?, ?, ?)",
+                (extractor_hash, env_hash, json.dumps(tools)),
+            )
+
+    def get_params(self, keys) -> dict:
+        """
+        Return the cached extractor results for (rule, path, sha256,
+        extractor_hash) keys. A result is only returned if neither the file
+        content nor the extractor script changed since it was stored.
+        """
+        results = {}
+        for key in keys:
+            row = self.db.execute(
+                "SELECT params FROM params "
+                "WHERE rule = ? AND path = ? AND sha256 = ? AND extractor_hash = ?",
+                key,
+            ).fetchone()
+            if row:
+                results[key] = json.loads(row[0])
+        if results:
+            now = time.time()
+            with self.db:
+                self.db.executemany(
+                    "UPDATE params SET last_used = ? WHERE rule = ? AND path = ?",
+                    [(now, rule, path) for rule, path, _, _ in results],
+                )
+        return results
+
+    def set_params(self, results: dict):
+        """
+        Store extractor results by (rule, path, sha256, extractor_hash) key,
+        replacing the outdated result of the same rule and path. Results that
+        are not JSON serializable are skipped.
+        """
+        now = time.time()
+        rows = []
+        for (rule, path, sha256, extractor_hash), params in results.items():
+            try:
+                text = json.dumps(params)
+            except (TypeError, ValueError):
+                continue
+            rows.append((rule, path, sha256, extractor_hash, text, len(text), now))
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO params VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def evict_params(self, max_size: int):
+        """
+        Evict the least recently used extractor results until their total
+        size is at most `max_size` bytes. The results are only sorted if they
+        exceed it.
+        """
+        (total,) = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM params"
+        ).fetchone()
+        if total <= max_size:
+            return
+        with self.db:
+            self.db.execute(
+                "DELETE FROM params WHERE rowid IN ("
+                "SELECT rowid FROM (SELECT rowid, SUM(size) OVER ("
+                "ORDER BY last_used DESC, rowid DESC) AS total FROM params) "
+                "WHERE total > ?)",
+                (max_size,),
+            )
+
+    def close(self):
+        try:
+            if self.params_size is not None:
+                self.evict_params(self.params_size)
+        finally:
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,105 @@
+import gzip
+import io
+import mimetypes
+import time
+import zipfile
+from pathlib import Path
+
+CHUNK_SIZE = 1024 * 1024
+
+# Formats that are worth deflating. Everything else, e.g. meshes, VTK or HDF5
+# files, is stored as is, because it barely compresses but costs a lot of CPU.
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/ld+json",
+    "application/n-quads",
+    "application/n-triples",
+    "application/xml",
+    "application/yaml",
+    "application/x-yaml",
+    "application/javascript",
+    "image/svg+xml",
+}
+COMPRESSIBLE_SUFFIXES = {".smk", ".yml", ".yaml", ".jsonl", ".log"}
+COMPRESSIBLE_NAMES = {"snakefile"}
+
+
+def is_compressible(path: str, mime_type=None) -> bool:
+    name = Path(path).name
+    if name.lower() in COMPRESSIBLE_NAMES or Path(name).suffix in COMPRESSIBLE_SUFFIXES:
+        return True
+    if mime_type is None:
+        mime_type, _ = mimetypes.guess_type(name, strict=False)
+    if not mime_type:
+        return False
+    return mime_type.startswith("text/") or mime_type in COMPRESSIBLE_TYPES
+
+
+def text_member(write):
+    """Adapt a function writing to a text file to a crate zip member."""
+
+    def write_binary(f):
+        with io.TextIOWrapper(f, encoding="utf8", newline="") as text:
+            write(text)
+
+    return write_binary
+
+
+def gzip_member(write, compresslevel=6):
+    """Adapt a crate zip member to write its content gzip-compressed."""
+
+    def write_gzip(f):
+        # No file name and a fixed mtime, so the output is reproducible.
+        with gzip.GzipFile(
+            filename="", mode="wb", fileobj=f, compresslevel=compresslevel, mtime=0
+        ) as compressed:
+            write(compressed)
+
+    return write_gzip
+
+
+def write_crate_zip(crate, out_path, members=None, compression_level=6):
+    """
+    Write an RO-Crate as a zip file, streaming every file in chunks.
+
+    Unlike `ROCrate.write_zip`, which deflates everything, each entry is
+    deflated with `compression_level` only if its format compresses well
+    (see `is_compressible`); all other entries are stored. The format is
+    taken from the `encodingFormat` of the entity, or guessed from the name.
+    `members` maps entity ids to functions that write the content of that
+    entity to a binary file object, for entities without a source file.
+    Entities mapped to None are only referenced and get no entry.
+    """
+    members = members or {}
+    with zipfile.ZipFile(out_path, "w", allowZip64=True) as archive:
+        for entity in crate.data_entities + crate.default_entities:
+            mime_type = entity.get("encodingFormat")
+            if entity.id in members:
+                if members[entity.id] is None:
+                    continue
+                with _open_entry(archive, entity.id, mime_type, compression_level) as f:
+                    members[entity.id](f)
+                continue
+            current_path, current_file = None, None
+            for path, chunk in entity.stream(chunk_size=CHUNK_SIZE):
+                if path != current_path:
+                    if current_file:
+                        current_file.close()
+                    current_path = path
+                    current_file = _open_entry(
+                        archive, path, mime_type, compression_level
+                    )
+                current_file.write(chunk)
+            if current_file:
+                current_file.close()
+    return out_path
+
+
+def _open_entry(archive, path, mime_type, compression_level):
+    info = zipfile.ZipInfo(path, date_time=time.localtime()[:6])
+    info.external_attr = 0o644 << 16
+    if compression_level and is_compressible(path, mime_type):
+        info.compress_type = zipfile.ZIP_DEFLATED
+        # ZipInfo.compress_level is only public from Python 3.13 on.
+        info._compresslevel = compression_level
+    return archive.open(info, mode="w", force_zip64=True)
@@ -0,0 +1,113 @@
+from snakemake_report_plugin_metadat4ing.crate import gzip_member, text_member
+from snakemake_report_plugin_metadat4ing.profiling import Profiler
+from snakemake_report_plugin_metadat4ing.rdf import (
+    NTriplesGraphWriter,
+    TurtleGraphWriter,
+)
+from snakemake_report_plugin_metadat4ing.writer import JsonLdGraphWriter
+
+# Serialization formats of the provenance graph: file suffix and media type.
+FORMATS = {
+    "jsonld": (".jsonld", "application/ld+json"),
+    "ttl": (".ttl", "text/turtle"),
+    "nt": (".nt", "application/n-triples"),
+    "nq": (".nq", "application/n-quads"),
+}
+DEFAULT_FORMATS = ("jsonld", "ttl")
+
+
+def encoding_format(fmt: str, gzip: bool = False) -> str:
+    return "application/gzip" if gzip else FORMATS[fmt][1]
+
+
+class ProvenanceWriters:
+    """
+    Stream the provenance graph, or a shard of it, in each of `formats`.
+
+    If `hashed` is set, the node digests are summed for `hexdigest`,
+    whether or not JSON-LD is one of the formats. The time of every writer
+    is recorded in the `<format>_nodes` phase of `profiler`.
+    """
+
+    def __init__(
+        self, formats, sections, converter, compact=False, hashed=False, profiler=None
+    ):
+        self.formats = tuple(formats)
+        self.profiler = profiler or Profiler()
+        self.jsonld = None
+        if "jsonld" in self.formats or hashed:
+            self.jsonld = JsonLdGraphWriter(
+                sections,
+                compact=compact,
+                text="jsonld" in self.formats,
+                canonical=hashed,
+            )
+        self.rdf = {}
+        for fmt in self.formats:
+            if fmt == "ttl":
+                self.rdf[fmt] = TurtleGraphWriter(converter)
+            elif fmt in ("nt", "nq"):
+                self.rdf[fmt] = NTriplesGraphWriter(converter, quads=fmt == "nq")
+
+    def add(self, section, node: dict):
+        if self.jsonld is not None:
+            with self.profiler.phase("jsonld_nodes"):
+                self.jsonld.add(section, node)
+        for fmt, writer in self.rdf.items():
+            with self.profiler.phase(f"{fmt}_nodes"):
+                writer.add(node)
+
+    def hexdigest(self, context: dict) -> str:
+        return self.jsonld.hexdigest(context)
+
+    def filenames(self, base: str, gzip: bool = False) -> dict:
+        """Return the file name for each format, e.g. `provenance.nt.gz`."""
+        return {
+            base + FORMATS[fmt][0] + (".gz" if gzip else ""): fmt
+            for fmt in self.formats
+        }
+
+    def members(self, base: str, context: dict, gzip=False, compresslevel=6) -> dict:
+        """Return the functions streaming each file of `filenames` into the crate."""
+        members = {}
+        for name, fmt in self.filenames(base, gzip).items():
+            if fmt == "jsonld":
+                member = text_member(lambda f: self.jsonld.write(f, context))
+            else:
+                member = text_member(
+                    lambda f, writer=self.rdf[fmt]: writer.write(f, context["local"])
+                )
+            members[name] = gzip_member(member, compresslevel) if gzip else member
+        return members
+
+    def spill(self, base: str):
+        """Spill every writer to the file `base` with the suffix of its format."""
+        if "jsonld" in self.formats:
+            self.jsonld.spill(base + FORMATS["jsonld"][0])
+        for fmt, writer in self.rdf.items():
+            writer.spill(base + FORMATS[fmt][0])
+
+    def suspend(self, base: str):
+        """Suspend every writer to files starting with `base`, see `JsonLdGraphWriter.suspend`."""
+        if self.jsonld is not None:
+            self.jsonld.suspend(base + FORMATS["jsonld"][0])
+        for fmt, writer in self.rdf.items():
+            writer.suspend(base + FORMATS[fmt][0])
+
+    def resume(self):
+        if self.jsonld is not None:
+            self.jsonld.resume()
+        for writer in self.rdf.values():
+            writer.resume()
+
+    def close(self):
+        if self.jsonld is not None:
+            self.jsonld.close()
+        for writer in self.rdf.values():
+            writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
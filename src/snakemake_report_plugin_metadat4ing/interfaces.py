@@ -7,4 +7,18 @@ class ParameterExtractorInterface(ABC):
     
     @abstractmethod
     def extract_tools(self, rule_name: str, env_file_content: str) -> dict:
-        ...    
\ No newline at end of file
+        ...
+
+    def extract_params_batch(self, items: list) -> dict:
+        """
+        Extract the parameters of many files at once.
+
+        `items` is a list of (rule_name, file_path) pairs. Returns a dictionary
+        mapping each pair to the result `extract_params` would return for it.
+        Override this to share parsed state between files; the reporter uses it
+        instead of `extract_params` when it is overridden.
+        """
+        return {
+            (rule_name, file_path): self.extract_params(rule_name, file_path)
+            for rule_name, file_path in items
+        }
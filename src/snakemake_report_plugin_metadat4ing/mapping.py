@@ -0,0 +1,243 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from fnmatch import translate
+from pathlib import Path
+
+from snakemake_report_plugin_metadat4ing.interfaces import (
+    ParameterExtractorInterface,
+)
+
+MAPPING_SUFFIXES = {".json", ".yaml", ".yml"}
+# The number of parsed files kept by a `MappingExtractor`.
+DOCUMENT_MEMO_SIZE = 1024
+
+_MISSING = object()
+_REQUIREMENT = re.compile(r"^([A-Za-z0-9_\-]+)([=<>!].*)?$")
+
+
+def _load_yaml(f):
+    # PyYAML comes with Snakemake, but is only needed for YAML files.
+    import yaml
+
+    return yaml.safe_load(f)
+
+
+def _load_document(path):
+    with open(path, encoding="utf8") as f:
+        if Path(path).suffix in (".yaml", ".yml"):
+            return _load_yaml(f)
+        return json.load(f)
+
+
+def _glob_matcher(pattern: str):
+    return re.compile(translate(pattern)).match
+
+
+def _data_type(value):
+    if isinstance(value, bool):
+        return "schema:Boolean"
+    if isinstance(value, float):
+        return "schema:Float"
+    if isinstance(value, int):
+        return "schema:Integer"
+    if isinstance(value, str):
+        return "schema:Text"
+    return None
+
+
+class _Pointer:
+    """A compiled JSON pointer (RFC 6901)."""
+
+    __slots__ = ("path", "tokens")
+
+    def __init__(self, path: str):
+        if path and not path.startswith("/"):
+            raise ValueError(f"Invalid JSON pointer '{path}': must start with '/'.")
+        self.path = path
+        self.tokens = tuple(
+            token.replace("~1", "/").replace("~0", "~") for token in path.split("/")[1:]
+        )
+
+    def resolve(self, document):
+        for token in self.tokens:
+            try:
+                if isinstance(document, list):
+                    document = document[int(token)]
+                else:
+                    document = document[token]
+            except (LookupError, TypeError, ValueError):
+                return _MISSING
+        return document
+
+
+class _Parameter:
+    __slots__ = ("name", "pointer", "unit", "data_type")
+
+    def __init__(self, name, spec):
+        if isinstance(spec, str):
+            spec = {"pointer": spec}
+        if not isinstance(spec, dict):
+            raise TypeError(f"Parameter '{name}' must be a string or a dictionary.")
+        if "pointer" not in spec:
+            raise ValueError(f"Parameter '{name}' needs a JSON pointer.")
+        self.name = name
+        self.pointer = _Pointer(spec["pointer"])
+        self.unit = spec.get("unit")
+        self.data_type = spec.get("data-type")
+
+
+class _FileMapping:
+    __slots__ = ("match_rule", "match_file", "match_name", "parameters")
+
+    def __init__(self, index, spec):
+        if not isinstance(spec, dict):
+            raise TypeError(f"Parameter mapping {index} must be a dictionary.")
+        if "files" not in spec:
+            raise ValueError(f"Parameter mapping {index} needs a 'files' glob.")
+        values = spec.get("values", {})
+        if not isinstance(values, dict):
+            raise TypeError(
+                f"'values' of parameter mapping {index} must be a dictionary."
+            )
+        self.match_rule = _glob_matcher(spec.get("rule", "*"))
+        self.match_file = _glob_matcher(spec["files"])
+        # Patterns without a directory match the file name in any directory.
+        self.match_name = "/" not in spec["files"]
+        self.parameters = [
+            _Parameter(name, parameter) for name, parameter in values.items()
+        ]
+
+    def matches(self, rule_name, file_path):
+        name = Path(file_path).name if self.match_name else str(file_path)
+        return self.match_rule(rule_name) and self.match_file(name)
+
+
+class MappingExtractor(ParameterExtractorInterface):
+    """
+    Extractor driven by a declarative mapping instead of a Python script.
+
+    The mapping, given as a dict or a YAML or JSON file, maps rules and file
+    globs to JSON pointers, units and data types:
+
+        parameters:
+          - rule: generate_input_files
+            files: "parameters_*.json"
+            values:
+              load: {pointer: /load/value, unit: "units:MegaPA"}
+              element-order: /element-order
+        tools:
+          fenics-dolfinx: FEniCS
+
+    `rule` defaults to all rules. The data type is inferred from the value
+    unless `data-type` is given. Values missing from a file, null values and
+    lists or objects without a `data-type` are skipped.
+    `tools` maps conda packages to tool names. The mapping is compiled once.
+    The last `DOCUMENT_MEMO_SIZE` parsed files are kept by path, modification
+    time and size, so a file is not parsed again for other values or jobs
+    while it is unchanged.
+    """
+
+    def __init__(self, mapping: dict):
+        if not isinstance(mapping, dict):
+            raise TypeError("The extractor mapping must be a dictionary.")
+        parameters = mapping.get("parameters", [])
+        if not isinstance(parameters, list):
+            raise TypeError("'parameters' of the extractor mapping must be a list.")
+        self.mappings = [
+            _FileMapping(index, spec) for index, spec in enumerate(parameters)
+        ]
+        self.tools = mapping.get("tools", {})
+        self.matches = {}
+        # Batches may be extracted on several threads.
+        self.documents = OrderedDict()
+        self.documents_lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(_load_document(path))
+
+    def extract_params(self, rule_name: str, file_path: str) -> dict:
+        return self.extract_params_batch([(rule_name, file_path)])[
+            (rule_name, file_path)
+        ]
+
+    def extract_params_batch(self, items: list) -> dict:
+        results = {}
+        for rule_name, file_path in items:
+            parameters = self._parameters(rule_name, file_path)
+            if not parameters:
+                results[(rule_name, file_path)] = {}
+                continue
+            results[(rule_name, file_path)] = self._extract(
+                parameters, self._document(file_path)
+            )
+        return results
+
+    def _document(self, file_path):
+        """Return the parsed file, memoized by path, modification time and size."""
+        st = os.stat(file_path)
+        key = (file_path, st.st_mtime_ns, st.st_size)
+        with self.documents_lock:
+            document = self.documents.get(key, _MISSING)
+            if document is not _MISSING:
+                self.documents.move_to_end(key)
+                return document
+        document = _load_document(file_path)
+        with self.documents_lock:
+            self.documents[key] = document
+            if len(self.documents) > DOCUMENT_MEMO_SIZE:
+                self.documents.popitem(last=False)
+        return document
+
+    def _parameters(self, rule_name, file_path):
+        """Return the parameters mapped for a rule and file, memoized."""
+        key = (rule_name, file_path)
+        parameters = self.matches.get(key)
+        if parameters is None:
+            parameters = [
+                parameter
+                for mapping in self.mappings
+                if mapping.matches(rule_name, file_path)
+                for parameter in mapping.parameters
+            ]
+            self.matches[key] = parameters
+        return parameters
+
+    def _extract(self, parameters, document):
+        results = {}
+        for parameter in parameters:
+            value = parameter.pointer.resolve(document)
+            if value is _MISSING or value is None:
+                continue
+            data_type = parameter.data_type or _data_type(value)
+            if data_type is None:
+                # Lists and objects have no scalar data type.
+                continue
+            results[parameter.name] = {
+                "value": value,
+                "unit": parameter.unit,
+                "json-path": parameter.pointer.path,
+                "data-type": data_type,
+            }
+        return results
+
+    def extract_tools(self, rule_name: str, env_file_content) -> dict:
+        if not self.tools:
+            return {}
+        environment = _load_yaml(env_file_content) or {}
+        requirements = []
+        for dependency in environment.get("dependencies", []):
+            if isinstance(dependency, dict):
+                for packages in dependency.values():
+                    requirements.extend(packages)
+            else:
+                requirements.append(dependency)
+        results = {}
+        for requirement in requirements:
+            match = _REQUIREMENT.match(str(requirement))
+            if match and match.group(1) in self.tools:
+                results[self.tools[match.group(1)]] = match.group(2)
+        return results
@@ -0,0 +1,90 @@
+import asyncio
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+class FileInfo:
+    """The file system facts about a file of the workflow."""
+
+    __slots__ = (
+        "exists",
+        "size",
+        "mtime_ns",
+        "inode",
+        "mime_type",
+        "realpath",
+        "sha256",
+    )
+
+    def __init__(self, exists, size, mtime_ns, inode, mime_type, realpath):
+        self.exists = exists
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.inode = inode
+        self.mime_type = mime_type
+        self.realpath = realpath
+        self.sha256 = None
+
+
+def mime_type(file_name) -> str:
+    """Guess the MIME type of a file from its name, `application/octet-stream` if unknown."""
+    guessed, _ = mimetypes.guess_type(Path(file_name).name, strict=False)
+    return guessed or "application/octet-stream"
+
+
+def stat_file(path: str) -> FileInfo:
+    """Collect the facts about a file; each call makes its own system calls."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return FileInfo(False, None, None, None, mime_type(path), None)
+    return FileInfo(
+        True,
+        st.st_size,
+        st.st_mtime_ns,
+        st.st_ino,
+        mime_type(path),
+        os.path.realpath(path),
+    )
+
+
+async def _map_bounded(func, items, concurrency):
+    """
+    Run `func` on every item on a pool of `concurrency` threads. Only
+    `concurrency` calls are in flight at any time, so that hundreds of
+    thousands of items do not create as many futures.
+    """
+    loop = asyncio.get_running_loop()
+    results = [None] * len(items)
+    indexes = iter(range(len(items)))
+
+    async def worker(executor):
+        for index in indexes:
+            results[index] = await loop.run_in_executor(executor, func, items[index])
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        await asyncio.gather(*(worker(executor) for _ in range(concurrency)))
+    return results
+
+
+def map_concurrent(func, items, concurrency: int) -> list:
+    """
+    Return `[func(item) for item in items]`, computed concurrently with
+    asyncio on at most `concurrency` threads.
+
+    Snakemake renders reports from within its event loop, in which case the
+    stage runs its own loop on a helper thread.
+    """
+    items = list(items)
+    if not items:
+        return []
+    concurrency = max(1, min(concurrency, len(items)))
+    coroutine = _map_bounded(func, items, concurrency)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
@@ -0,0 +1,231 @@
+import sys
+
+# Predicate names and types of the metadata4ing graph. They are interned, so
+# that all materialized nodes share the same key objects.
+ID = sys.intern("@id")
+TYPE = sys.intern("@type")
+LABEL = sys.intern("label")
+POSITION = sys.intern("schema:position")
+PART_OF = sys.intern("part of")
+START_TIME = sys.intern("start time")
+END_TIME = sys.intern("end time")
+HAS_INPUT = sys.intern("has input")
+HAS_OUTPUT = sys.intern("has output")
+HAS_PARAMETER = sys.intern("has parameter")
+HAS_TOOL = sys.intern("has employed tool")
+CONTENT_SIZE = sys.intern("schema:contentSize")
+SHA256 = sys.intern("schema:sha256")
+STRING_VALUE = sys.intern("has string value")
+NUMERICAL_VALUE = sys.intern("has numerical value")
+HAS_UNIT = sys.intern("has unit")
+REPRESENTS = sys.intern("represents")
+SOURCE = sys.intern("source")
+FILE_OBJECT = sys.intern("file object")
+EXTRACT = sys.intern("cr:extract")
+JSON_PATH = sys.intern("cr:jsonPath")
+DATA_TYPE = sys.intern("cr:dataType")
+SOFTWARE_VERSION = sys.intern("schema:softwareVersion")
+
+PROCESSING_STEP = sys.intern("processing step")
+FILE_OBJECT_TYPE = sys.intern("cr:FileObject")
+TEXT_VARIABLE = sys.intern("text variable")
+NUMERICAL_VARIABLE = sys.intern("numerical variable")
+FIELD = sys.intern("Field")
+SOFTWARE_APPLICATION = sys.intern("schema:SoftwareApplication")
+
+
+class NodeIds:
+    """
+    Table of the ids of nodes that other nodes refer to.
+
+    Nodes store references as integer indexes into this table; the ids are
+    only looked up when a node is materialized.
+    """
+
+    __slots__ = ("ids",)
+
+    def __init__(self):
+        self.ids = []
+
+    def add(self, node_id: str) -> int:
+        self.ids.append(sys.intern(node_id))
+        return len(self.ids) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return self.ids[index]
+
+    def refs(self, indexes) -> list:
+        return [{ID: self.ids[index]} for index in indexes]
+
+
+def intern_str(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class Parameter:
+    """A parameter returned by the extractor for a file, before it becomes a node."""
+
+    __slots__ = ("name", "value", "unit", "json_path", "data_type")
+
+    def __init__(self, name, value, unit, json_path, data_type):
+        self.name = intern_str(name)
+        self.value = intern_str(value)
+        self.unit = intern_str(unit)
+        self.json_path = intern_str(json_path)
+        self.data_type = intern_str(data_type)
+
+
+class StepNode:
+    __slots__ = ("ref", "label", "position")
+
+    def __init__(self, ref, label, position):
+        self.ref = ref
+        self.label = label
+        self.position = position
+
+    def to_dict(self, ids: NodeIds) -> dict:
+        return {
+            ID: ids[self.ref],
+            TYPE: PROCESSING_STEP,
+            LABEL: self.label,
+            POSITION: self.position,
+        }
+
+
+class JobNode:
+    __slots__ = (
+        "id",
+        "label",
+        "part_of",
+        "start_time",
+        "end_time",
+        "inputs",
+        "outputs",
+        "parameters",
+        "tools",
+        "script",
+    )
+
+    def __init__(self, id, label, part_of, start_time, end_time):
+        self.id = id
+        self.label = label
+        self.part_of = part_of
+        self.start_time = start_time
+        self.end_time = end_time
+        self.inputs = []
+        self.outputs = []
+        self.parameters = []
+        self.tools = []
+        # The path of the job's script, an entity of the crate, not a node.
+        self.script = None
+
+    def to_dict(self, ids: NodeIds) -> dict:
+        tools = ids.refs(self.tools)
+        if self.script is not None:
+            tools.append({ID: self.script})
+        return {
+            ID: self.id,
+            TYPE: PROCESSING_STEP,
+            LABEL: self.label,
+            PART_OF: {ID: ids[self.part_of]},
+            START_TIME: self.start_time,
+            END_TIME: self.end_time,
+            HAS_INPUT: ids.refs(self.inputs),
+            HAS_OUTPUT: ids.refs(self.outputs),
+            HAS_PARAMETER: ids.refs(self.parameters),
+            HAS_TOOL: tools,
+        }
+
+    def refs(self) -> list:
+        """Return the references of this node to other nodes."""
+        return [
+            self.part_of,
+            *self.inputs,
+            *self.outputs,
+            *self.parameters,
+            *self.tools,
+        ]
+
+
+class FileNode:
+    __slots__ = ("ref", "checksum")
+
+    def __init__(self, ref, checksum=None):
+        self.ref = ref
+        self.checksum = checksum
+
+    def to_dict(self, ids: NodeIds) -> dict:
+        node = {ID: ids[self.ref], TYPE: FILE_OBJECT_TYPE, LABEL: ids[self.ref]}
+        if self.checksum:
+            size, sha256 = self.checksum
+            node[CONTENT_SIZE] = str(size)
+            node[SHA256] = sha256
+        return node
+
+
+class ParamNode:
+    __slots__ = ("ref", "label", "value", "unit", "is_text")
+
+    def __init__(self, ref, label, value, unit, is_text):
+        self.ref = ref
+        self.label = label
+        self.value = value
+        self.unit = unit
+        self.is_text = is_text
+
+    def to_dict(self, ids: NodeIds) -> dict:
+        node = {
+            TYPE: TEXT_VARIABLE if self.is_text else NUMERICAL_VARIABLE,
+            LABEL: self.label,
+        }
+        if self.is_text:
+            node[STRING_VALUE] = self.value
+        else:
+            node[NUMERICAL_VALUE] = self.value
+            if self.unit:
+                node[HAS_UNIT] = {ID: self.unit}
+        node[ID] = ids[self.ref]
+        return node
+
+
+class FieldNode:
+    __slots__ = ("id", "represents", "file", "json_path", "data_type")
+
+    def __init__(self, id, represents, file, json_path, data_type):
+        self.id = id
+        self.represents = represents
+        self.file = file
+        self.json_path = json_path
+        self.data_type = data_type
+
+    def to_dict(self, ids: NodeIds) -> dict:
+        node = {
+            ID: self.id,
+            TYPE: FIELD,
+            REPRESENTS: {ID: ids[self.represents]},
+            SOURCE: {
+                FILE_OBJECT: {ID: ids[self.file]},
+                EXTRACT: {JSON_PATH: self.json_path},
+            },
+        }
+        if self.data_type:
+            node[DATA_TYPE] = self.data_type
+        return node
+
+    def refs(self) -> list:
+        return [self.represents, self.file]
+
+
+class ToolNode:
+    __slots__ = ("ref", "label", "version")
+
+    def __init__(self, ref, label, version):
+        self.ref = ref
+        self.label = label
+        self.version = version
+
+    def to_dict(self, ids: NodeIds) -> dict:
+        node = {ID: ids[self.ref], TYPE: SOFTWARE_APPLICATION, LABEL: self.label}
+        if self.version:
+            node[SOFTWARE_VERSION] = self.version
+        return node
@@ -0,0 +1,83 @@
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+_DISABLED = nullcontext()
+
+
+class Profiler:
+    """
+    Collect the timing summary of a report.
+
+    Phases may nest or repeat; the time of every call is added up. When the
+    profiler is disabled, `phase` returns a shared no-op context manager and
+    all other methods return immediately.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.phases = {}
+        self.rules = {}
+        self.files = {}
+        self.start = time.perf_counter()
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return _DISABLED
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(self.phases, name, time.perf_counter() - start)
+
+    def add_extractor_time(self, rule: str, seconds: float, calls: int = 1):
+        if self.enabled:
+            self._add(self.rules, rule, seconds, calls)
+
+    def add_file(self, name: str, size: int, compressed_size=None):
+        if self.enabled:
+            self.files[name] = {"size": size, "compressed_size": compressed_size}
+
+    def _add(self, stats, name, seconds, calls=1):
+        entry = stats.setdefault(name, {"seconds": 0.0, "calls": 0})
+        entry["seconds"] += seconds
+        entry["calls"] += calls
+
+    def summary(self) -> dict:
+        return {
+            "total_seconds": time.perf_counter() - self.start,
+            "phases": self.phases,
+            "extractor_rules": self.rules,
+            "files": self.files,
+        }
+
+    def write(self, path):
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(self.summary(), f, indent=4)
+
+    def table(self) -> str:
+        """Format the summary as a plain text table for the log."""
+        summary = self.summary()
+        lines = [f"{'Phase':<24}{'Seconds':>12}{'Calls':>10}"]
+        for name, entry in summary["phases"].items():
+            lines.append(f"{name:<24}{entry['seconds']:>12.3f}{entry['calls']:>10}")
+        lines.append(f"{'total':<24}{summary['total_seconds']:>12.3f}")
+        if summary["extractor_rules"]:
+            lines.append("")
+            lines.append(f"{'Extractor rule':<24}{'Seconds':>12}{'Calls':>10}")
+            for name, entry in summary["extractor_rules"].items():
+                lines.append(f"{name:<24}{entry['seconds']:>12.3f}{entry['calls']:>10}")
+        if summary["files"]:
+            lines.append("")
+            lines.append(f"{'File':<40}{'Bytes':>14}{'Compressed':>14}")
+            for name, entry in summary["files"].items():
+                compressed = entry["compressed_size"]
+                lines.append(
+                    f"{name:<40}{entry['size']:>14}"
+                    f"{'' if compressed is None else compressed:>14}"
+                )
+        return "\n".join(lines)
@@ -0,0 +1,314 @@
+import math
+import re
+from tempfile import SpooledTemporaryFile
+from urllib.parse import urljoin
+
+from snakemake_report_plugin_metadat4ing.writer import CHUNK_SIZE, SPOOL_SIZE
+
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+XSD = "http://www.w3.org/2001/XMLSchema#"
+GEN_DELIMS = (":", "/", "?", "#", "[", "]", "@")
+
+# Stands in for the namespace of the `local` prefix, which depends on the
+# simulation hash and is only known once all nodes have been written.
+LOCAL_PLACEHOLDER = "\x00"
+
+_PN_LOCAL = re.compile(r"^[A-Za-z0-9_]([A-Za-z0-9_.-]*[A-Za-z0-9_-])?$")
+_PN_PREFIX = re.compile(r"^[A-Za-z]([A-Za-z0-9_.-]*[A-Za-z0-9_-])?$")
+_LITERAL_ESCAPES = {"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_LITERAL_SPECIAL = re.compile(r'[\\"\n\r\t\x00-\x1f\x7f]')
+_IRI_SPECIAL = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+
+
+class RdfConverter:
+    """
+    Convert the JSON-LD nodes built by the Reporter into RDF terms.
+
+    Only the JSON-LD features used by the Reporter's nodes are supported:
+    term definitions with `@id` and `@type` coercion from a flat context,
+    compact IRIs, relative `@id`s, node references, nested blank nodes and
+    arrays. The result follows rdflib's JSON-LD parser, so that the graphs
+    are isomorphic. Terms are tuples: `("iri", iri, prefix, local)`,
+    `("literal", lexical, datatype)` or `("bnode", properties)`.
+    """
+
+    def __init__(self, context: dict, base: str):
+        self.base = base
+        self.vocab = context.get("@vocab")
+        self.prefixes = {"local": LOCAL_PLACEHOLDER}
+        definitions = {}
+        for name, definition in context.items():
+            if name.startswith("@") or name == "local":
+                continue
+            if isinstance(definition, str):
+                definition = {"@id": definition}
+            if isinstance(definition, dict) and "@id" in definition:
+                definitions[name] = definition
+                if definition["@id"].endswith(GEN_DELIMS) and ":" not in name:
+                    self.prefixes[name] = definition["@id"]
+        self.terms = {}
+        for name, definition in definitions.items():
+            datatype = definition.get("@type")
+            if datatype and datatype not in ("@id", "@vocab"):
+                datatype = self._expand(datatype, vocab=True)[1]
+            self.terms[name] = (self._expand(definition["@id"], vocab=False), datatype)
+
+    def _expand(self, value: str, vocab: bool):
+        if vocab and value in self.terms:
+            return self.terms[value][0]
+        prefix, sep, local = value.partition(":")
+        if sep and not local.startswith("//"):
+            if prefix in self.prefixes:
+                return ("iri", self.prefixes[prefix] + local, prefix, local)
+            if prefix == "_":
+                return ("iri", value, None, None)
+        elif not sep and vocab and self.vocab:
+            return ("iri", self.vocab + value, None, None)
+        if sep:
+            return ("iri", value, None, None)
+        return ("iri", urljoin(self.base, value.replace(" ", "%20")), None, None)
+
+    def describe(self, node: dict):
+        """Return the subject of a node and a list of (predicate, object) pairs."""
+        subject = self._expand(node["@id"], vocab=False) if "@id" in node else None
+        return subject, self._properties(node)
+
+    def _properties(self, node: dict):
+        properties = []
+        for key, value in node.items():
+            if key.startswith("@") and key != "@type":
+                continue
+            if key == "@type":
+                predicate = ("iri", RDF_TYPE, "rdf", "type")
+                for item in value if isinstance(value, list) else [value]:
+                    properties.append((predicate, self._expand(item, vocab=True)))
+                continue
+            predicate, datatype = self.terms.get(key) or (
+                self._expand(key, vocab=True),
+                None,
+            )
+            for item in value if isinstance(value, list) else [value]:
+                obj = self._object(item, datatype)
+                if obj is not None:
+                    properties.append((predicate, obj))
+        return properties
+
+    def _object(self, value, datatype):
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            if "@value" in value:
+                return self._literal(value["@value"], value.get("@type"))
+            if "@id" in value:
+                return self._expand(value["@id"], vocab=False)
+            return ("bnode", self._properties(value))
+        if datatype == "@id" and isinstance(value, str):
+            return self._expand(value, vocab=False)
+        if datatype == "@vocab" and isinstance(value, str):
+            return self._expand(value, vocab=True)
+        return self._literal(value, datatype)
+
+    def _literal(self, value, datatype):
+        if isinstance(datatype, str) and datatype.startswith("@"):
+            datatype = None
+        if isinstance(datatype, str):
+            datatype = self._expand(datatype, vocab=True)[1]
+        if isinstance(value, bool):
+            return (
+                "literal",
+                "true" if value else "false",
+                datatype or XSD + "boolean",
+            )
+        if isinstance(value, float) and not datatype:
+            if math.isnan(value):
+                lexical = "NaN"
+            elif math.isinf(value):
+                lexical = "INF" if value > 0 else "-INF"
+            else:
+                lexical = repr(value)
+            return ("literal", lexical, XSD + "double")
+        if isinstance(value, int) and not datatype:
+            return ("literal", str(value), XSD + "integer")
+        return ("literal", str(value), datatype)
+
+
+def format_literal(lexical: str) -> str:
+    return '"' + _LITERAL_SPECIAL.sub(_escape_char, lexical) + '"'
+
+
+def format_iri(iri: str) -> str:
+    return "<" + _IRI_SPECIAL.sub(_escape_iri_char, iri) + ">"
+
+
+def _escape_char(match):
+    char = match.group()
+    return _LITERAL_ESCAPES.get(char) or f"\\u{ord(char):04X}"
+
+
+def _escape_iri_char(match):
+    char = match.group()
+    # The placeholder is replaced by the real namespace when the file is written.
+    return char if char == LOCAL_PLACEHOLDER else f"\\u{ord(char):04X}"
+
+
+class TurtleGraphWriter:
+    """
+    Stream the nodes of the provenance graph as Turtle.
+
+    Every node is converted with `RdfConverter` and written to a spooled
+    temporary file as soon as it is added. `write` emits the `@prefix`
+    declarations of all prefixes in use, followed by the spooled statements.
+    """
+
+    def __init__(self, converter: RdfConverter):
+        self.converter = converter
+        self.used_prefixes = set()
+        self.body = SpooledTemporaryFile(SPOOL_SIZE, mode="w+", encoding="utf8")
+        self.spilled = None
+        self.suspended = None
+
+    def add(self, node: dict):
+        subject, properties = self.converter.describe(node)
+        if not properties:
+            return
+        self.body.write(self._term(subject) + " " if subject else "[] ")
+        self.body.write(self._properties(properties, "    ") + " .\n\n")
+
+    def _properties(self, properties, indent):
+        grouped = {}
+        for predicate, obj in properties:
+            grouped.setdefault(predicate, []).append(obj)
+        statements = []
+        for predicate, objects in grouped.items():
+            verb = "a" if predicate[1] == RDF_TYPE else self._term(predicate)
+            statements.append(
+                verb + " " + " , ".join(self._term(obj, indent) for obj in objects)
+            )
+        return (" ;\n" + indent).join(statements)
+
+    def _term(self, term, indent=""):
+        kind = term[0]
+        if kind == "iri":
+            _, iri, prefix, local = term
+            if prefix and _PN_PREFIX.match(prefix) and _PN_LOCAL.match(local):
+                self.used_prefixes.add(prefix)
+                return f"{prefix}:{local}"
+            return format_iri(iri)
+        if kind == "literal":
+            _, lexical, datatype = term
+            if datatype:
+                return format_literal(lexical) + "^^" + format_iri(datatype)
+            return format_literal(lexical)
+        nested = indent + "    "
+        if not term[1]:
+            return "[]"
+        return "[ " + self._properties(term[1], nested) + " ]"
+
+    def write(self, f, local_namespace: str):
+        """Write the Turtle document to the text file object `f`."""
+        self._write_prefixes(f, local_namespace)
+        spilled = self.spilled or (self.body is None and self.suspended)
+        if spilled:
+            with open(spilled, encoding="utf8", newline="") as body:
+                self._write_body(f, body, local_namespace)
+        else:
+            self.body.seek(0)
+            self._write_body(f, self.body, local_namespace)
+
+    def _write_prefixes(self, f, local_namespace):
+        namespaces = {
+            "rdf": "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+            **self.converter.prefixes,
+            "local": local_namespace,
+        }
+        for prefix in sorted(self.used_prefixes):
+            f.write(f"@prefix {prefix}: {format_iri(namespaces[prefix])} .\n")
+        f.write("\n")
+
+    def _write_body(self, f, body, local_namespace):
+        for line in body:
+            f.write(line.replace(LOCAL_PLACEHOLDER, local_namespace))
+
+    def spill(self, path):
+        """Move the statements written so far to the file `path`, see `JsonLdGraphWriter.spill`."""
+        with open(path, "w", encoding="utf8", newline="") as f:
+            self.body.seek(0)
+            while chunk := self.body.read(CHUNK_SIZE):
+                f.write(chunk)
+        self.close()
+        self.spilled = path
+
+    def suspend(self, path):
+        """Move the statements to the file `path` and close it, see `JsonLdGraphWriter.suspend`."""
+        if self.body is None:
+            return
+        if self.suspended is None:
+            with open(path, "w", encoding="utf8", newline="") as f:
+                self.body.seek(0)
+                while chunk := self.body.read(CHUNK_SIZE):
+                    f.write(chunk)
+            self.suspended = path
+        self.body.close()
+        self.body = None
+
+    def resume(self):
+        if self.suspended is not None and self.body is None:
+            self.body = open(self.suspended, "a+", encoding="utf8", newline="")
+
+    def close(self):
+        if self.body is not None:
+            self.body.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class NTriplesGraphWriter(TurtleGraphWriter):
+    """
+    Stream the nodes of the provenance graph as N-Triples, or as N-Quads in
+    the graph named by the `local` namespace if `quads` is set.
+
+    Every triple is a line of its own with full IRIs, so the output can be
+    split at any line and loaded in parallel. Blank nodes are labelled with
+    a counter that is unique within the document.
+    """
+
+    def __init__(self, converter: RdfConverter, quads: bool = False):
+        super().__init__(converter)
+        self.end = f" {format_iri(LOCAL_PLACEHOLDER)} .\n" if quads else " .\n"
+        self.bnodes = 0
+
+    def add(self, node: dict):
+        subject, properties = self.converter.describe(node)
+        self._triples(self._term(subject) if subject else self._bnode(), properties)
+
+    def _triples(self, subject, properties):
+        for predicate, obj in properties:
+            if obj[0] == "bnode":
+                label = self._bnode()
+                self.body.write(
+                    f"{subject} {format_iri(predicate[1])} {label}{self.end}"
+                )
+                self._triples(label, obj[1])
+            else:
+                self.body.write(
+                    f"{subject} {format_iri(predicate[1])} {self._term(obj)}{self.end}"
+                )
+
+    def _bnode(self):
+        self.bnodes += 1
+        return f"_:b{self.bnodes}"
+
+    def _term(self, term, indent=""):
+        if term[0] == "iri":
+            return format_iri(term[1])
+        _, lexical, datatype = term
+        if datatype:
+            return format_literal(lexical) + "^^" + format_iri(datatype)
+        return format_literal(lexical)
+
+    def _write_prefixes(self, f, local_namespace):
+        pass
@@ -0,0 +1,185 @@
+import json
+from collections import OrderedDict
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from snakemake_report_plugin_metadat4ing.crate import text_member
+from snakemake_report_plugin_metadat4ing.formats import (
+    ProvenanceWriters,
+    encoding_format,
+)
+from snakemake_report_plugin_metadat4ing.nodes import ID, TYPE, NodeIds
+
+SHARD_DIR = "provenance"
+INDEX_FILENAME = "provenance-index.jsonld"
+# The number of rule shards whose writers are kept open.
+MAX_OPEN_SHARDS = 8
+
+
+class _Shard:
+    def __init__(self, name, writers: ProvenanceWriters):
+        self.name = name
+        self.writers = writers
+        # References of the nodes already written to this shard.
+        self.refs = set()
+        self.steps = []
+
+
+class ShardedGraph:
+    """
+    Split the provenance graph into one document per rule, or per
+    `jobs_per_shard` jobs, in each of `formats`, plus a JSON-LD index.
+
+    Every shard is self-contained: before a job or field node is written to
+    a shard, the steps, files, parameters and tools it refers to are written
+    to it as well, unless the shard already holds them. Shared nodes are thus
+    repeated across shards. With `mode="jobs"`, a shard is complete as soon as
+    the next one starts, so it is spilled to a temporary file and only a
+    bounded number of nodes is kept in memory. With `mode="rule"`, jobs of
+    any rule may follow, so only the `MAX_OPEN_SHARDS` most recently used
+    shards are kept open; the others are suspended to temporary files and
+    resumed when their rule has another job.
+    """
+
+    def __init__(
+        self,
+        mode,
+        jobs_per_shard,
+        formats,
+        sections,
+        converter,
+        node_ids: NodeIds,
+        compact=False,
+        gzip=False,
+    ):
+        self.mode = mode
+        self.jobs_per_shard = jobs_per_shard
+        self.formats = formats
+        self.sections = sections
+        self.converter = converter
+        self.node_ids = node_ids
+        self.compact = compact
+        self.gzip = gzip
+        self.shards = {}
+        self.open_shards = OrderedDict()
+        self.current = None
+        # Nodes that other nodes refer to, by reference, with their section.
+        self.ref_nodes = {}
+        self.step_refs = []
+        self.jobs = 0
+        self.tmpdir = TemporaryDirectory(prefix="metadat4ing-shards-")
+
+    def start_job(self, rule):
+        """Select the shard for the next job and its nodes."""
+        if self.mode == "rule":
+            name = rule
+        else:
+            name = f"jobs-{self.jobs // self.jobs_per_shard:05d}"
+        self.jobs += 1
+        if name not in self.shards:
+            if self.mode == "jobs" and self.current is not None:
+                self._spill(self.current)
+            self.shards[name] = _Shard(
+                name,
+                ProvenanceWriters(
+                    self.formats, self.sections, self.converter, compact=self.compact
+                ),
+            )
+        self.current = self.shards[name]
+        if self.mode == "rule":
+            self._open(self.current)
+
+    def add(self, section, node, data: dict):
+        """Add a node, materialized as `data`, to the current shard."""
+        ref = getattr(node, "ref", None)
+        if ref is not None:
+            self.ref_nodes[ref] = (section, node)
+            if section == "steps":
+                self.step_refs.append(ref)
+        if self.current is not None:
+            self._add_to(self.current, section, node, data)
+
+    def _add_to(self, shard, section, node, data):
+        for ref in node.refs() if hasattr(node, "refs") else ():
+            if ref not in shard.refs:
+                ref_section, ref_node = self.ref_nodes[ref]
+                self._add_to(
+                    shard, ref_section, ref_node, ref_node.to_dict(self.node_ids)
+                )
+        ref = getattr(node, "ref", None)
+        if ref is not None:
+            shard.refs.add(ref)
+            if section == "steps":
+                shard.steps.append(ref)
+        shard.writers.add(section, data)
+
+    def _open(self, shard):
+        """Resume a rule shard and suspend the least recently used one."""
+        if shard.name in self.open_shards:
+            self.open_shards.move_to_end(shard.name)
+            return
+        shard.writers.resume()
+        self.open_shards[shard.name] = shard
+        if len(self.open_shards) > MAX_OPEN_SHARDS:
+            _, idle = self.open_shards.popitem(last=False)
+            idle.writers.suspend(str(Path(self.tmpdir.name) / idle.name))
+
+    def _spill(self, shard):
+        shard.writers.spill(str(Path(self.tmpdir.name) / shard.name))
+        shard.refs = set()
+
+    def filenames(self) -> dict:
+        """Return the names of the index and shard files with their formats."""
+        names = {INDEX_FILENAME: "jsonld"}
+        for name, shard in self.shards.items():
+            names.update(shard.writers.filenames(f"{SHARD_DIR}/{name}", self.gzip))
+        return names
+
+    def members(self, context: dict, compresslevel=6) -> dict:
+        """Return the functions writing each file of `filenames` to the crate."""
+        members = {INDEX_FILENAME: text_member(lambda f: self.write_index(f, context))}
+        for name, shard in self.shards.items():
+            members.update(
+                shard.writers.members(
+                    f"{SHARD_DIR}/{name}", context, self.gzip, compresslevel
+                )
+            )
+        return members
+
+    def write_index(self, f, context: dict):
+        """
+        Write the index document, which holds the processing steps of the
+        workflow and one entry per shard file with the steps it is about.
+        """
+        graph = [
+            self.ref_nodes[ref][1].to_dict(self.node_ids) for ref in self.step_refs
+        ]
+        for name, shard in self.shards.items():
+            about = [{ID: self.node_ids[ref]} for ref in shard.steps]
+            filenames = shard.writers.filenames(f"{SHARD_DIR}/{name}", self.gzip)
+            for filename, fmt in filenames.items():
+                graph.append(
+                    {
+                        ID: filename,
+                        TYPE: "schema:MediaObject",
+                        "schema:name": filename.rpartition("/")[2],
+                        "schema:encodingFormat": encoding_format(fmt, self.gzip),
+                        "schema:about": about,
+                    }
+                )
+        document = {"@context": context, "@graph": graph}
+        if self.compact:
+            json.dump(document, f, ensure_ascii=False, separators=(",", ":"))
+        else:
+            json.dump(document, f, indent=4, ensure_ascii=False)
+
+    def close(self):
+        for shard in self.shards.values():
+            shard.writers.close()
+        self.tmpdir.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
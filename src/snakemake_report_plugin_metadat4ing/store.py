@@ -0,0 +1,283 @@
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+from snakemake_report_plugin_metadat4ing.nodes import NodeIds
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    hash TEXT UNIQUE,
+    workdir TEXT NOT NULL,
+    crate TEXT,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS steps (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    id TEXT NOT NULL,
+    label TEXT NOT NULL,
+    position INTEGER,
+    PRIMARY KEY (run, id)
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    id TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    label TEXT NOT NULL,
+    start_time TEXT,
+    end_time TEXT,
+    PRIMARY KEY (run, id)
+);
+CREATE TABLE IF NOT EXISTS files (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    size INTEGER,
+    sha256 TEXT,
+    PRIMARY KEY (run, path)
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    job TEXT NOT NULL,
+    path TEXT NOT NULL,
+    role TEXT NOT NULL CHECK (role IN ('input', 'output'))
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    id TEXT NOT NULL,
+    label TEXT NOT NULL,
+    value,
+    unit TEXT,
+    PRIMARY KEY (run, id)
+);
+CREATE TABLE IF NOT EXISTS job_parameters (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    job TEXT NOT NULL,
+    parameter TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fields (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    id TEXT NOT NULL,
+    parameter TEXT NOT NULL,
+    file TEXT NOT NULL,
+    json_path TEXT,
+    data_type TEXT,
+    PRIMARY KEY (run, id)
+);
+CREATE INDEX IF NOT EXISTS parameters_label_value_unit
+    ON parameters (label, value, unit);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256);
+CREATE INDEX IF NOT EXISTS jobs_rule ON jobs (rule);
+CREATE INDEX IF NOT EXISTS job_files_run_job ON job_files (run, job);
+CREATE INDEX IF NOT EXISTS job_parameters_run_parameter
+    ON job_parameters (run, parameter);
+"""
+
+# Rows are buffered and staged in batches of this size.
+BATCH_SIZE = 10_000
+
+# The columns of each table after `run`.
+_COLUMNS = {
+    "steps": ("id", "label", "position"),
+    "jobs": ("id", "rule", "label", "start_time", "end_time"),
+    "files": ("path", "size", "sha256"),
+    "job_files": ("job", "path", "role"),
+    "parameters": ("id", "label", "value", "unit"),
+    "job_parameters": ("job", "parameter"),
+    "fields": ("id", "parameter", "file", "json_path", "data_type"),
+}
+
+
+class ProvenanceStore:
+    """
+    SQLite database with the provenance of many reports, for queries across
+    runs without unpacking their crates.
+
+    A report is added with `begin_run`, `add` for every node and `finish`.
+    The rows are staged in TEMP tables, which are private to the connection
+    and take no lock on the database, and `finish` copies them in one short
+    transaction. Reports writing to the same store at the same time thus
+    only wait for each other's `finish`. A run is identified by its
+    simulation hash, so reporting the same run again replaces it. Node ids
+    are stored in their compact form, e.g. `local:variable_load_3`; the
+    `local` namespace of a run follows from its hash.
+    """
+
+    def __init__(self, path: Path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.executescript(SCHEMA)
+        for table, columns in _COLUMNS.items():
+            self.db.execute(
+                f"CREATE TEMP TABLE IF NOT EXISTS staged_{table} "
+                f"AS SELECT {', '.join(columns)} FROM main.{table} WHERE 0"
+            )
+        self.db.commit()
+        self.run = None
+        self.rows = {table: [] for table in _COLUMNS}
+        self.rules = {}
+
+    def begin_run(self, workdir: str):
+        """Start adding the nodes of a report made in `workdir`."""
+        self.run = (workdir, time.time())
+        self.rules = {}
+        for table in _COLUMNS:
+            self.rows[table] = []
+            self.db.execute(f"DELETE FROM temp.staged_{table}")
+        self.db.commit()
+
+    def add(self, section: str, node, ids: NodeIds):
+        """Add a node of the provenance graph to the current run."""
+        if section == "steps":
+            self.rules[node.ref] = node.label
+            self._insert("steps", (ids[node.ref], node.label, node.position))
+        elif section == "jobs":
+            self._insert(
+                "jobs",
+                (
+                    node.id,
+                    self.rules[node.part_of],
+                    node.label,
+                    node.start_time,
+                    node.end_time,
+                ),
+            )
+            for role, refs in (("input", node.inputs), ("output", node.outputs)):
+                for ref in refs:
+                    self._insert("job_files", (node.id, ids[ref], role))
+            for ref in node.parameters:
+                self._insert("job_parameters", (node.id, ids[ref]))
+        elif section == "files":
+            size, sha256 = node.checksum or (None, None)
+            self._insert("files", (ids[node.ref], size, sha256))
+        elif section == "params":
+            value = node.value
+            if not isinstance(value, (str, int, float)):
+                value = json.dumps(value)
+            unit = None if node.is_text else node.unit or None
+            self._insert("parameters", (ids[node.ref], node.label, value, unit))
+        elif section == "fields":
+            self._insert(
+                "fields",
+                (
+                    node.id,
+                    ids[node.represents],
+                    ids[node.file],
+                    node.json_path,
+                    node.data_type,
+                ),
+            )
+
+    def _insert(self, table, row):
+        rows = self.rows[table]
+        rows.append(row)
+        if len(rows) >= BATCH_SIZE:
+            self._flush(table)
+
+    def _flush(self, table):
+        placeholders = ", ".join("?" * len(_COLUMNS[table]))
+        self.db.executemany(
+            f"INSERT INTO temp.staged_{table} VALUES ({placeholders})",
+            self.rows[table],
+        )
+        self.db.commit()
+        self.rows[table] = []
+
+    def finish(self, simulation_hash: str, crate=None):
+        """Commit the current run, replacing an earlier run with the same hash."""
+        for table in self.rows:
+            self._flush(table)
+        workdir, created = self.run
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.execute("DELETE FROM runs WHERE hash = ?", (simulation_hash,))
+            run = self.db.execute(
+                "INSERT INTO runs (hash, workdir, crate, created) VALUES (?, ?, ?, ?)",
+                (
+                    simulation_hash,
+                    workdir,
+                    None if crate is None else str(crate),
+                    created,
+                ),
+            ).lastrowid
+            for table, columns in _COLUMNS.items():
+                columns = ", ".join(columns)
+                self.db.execute(
+                    f"INSERT INTO main.{table} (run, {columns}) "
+                    f"SELECT ?, {columns} FROM temp.staged_{table}",
+                    (run,),
+                )
+        for table in _COLUMNS:
+            self.db.execute(f"DELETE FROM temp.staged_{table}")
+        self.db.commit()
+        self.run = None
+
+    def find_runs(self, label: str, value=None, unit=None) -> list:
+        """Return the runs with a parameter `label`, optionally of a given value and unit."""
+        where, args = self._parameter_filter(label, value, unit)
+        return self._query(
+            "SELECT DISTINCT runs.hash AS run, runs.workdir, runs.crate "
+            "FROM parameters JOIN runs ON runs.id = parameters.run "
+            f"WHERE {where} ORDER BY runs.created",
+            args,
+        )
+
+    def find_jobs(self, label: str, value=None, unit=None) -> list:
+        """Return the jobs that used a parameter, with their run, rule and value."""
+        where, args = self._parameter_filter(label, value, unit)
+        return self._query(
+            "SELECT runs.hash AS run, jobs.id AS job, jobs.rule, "
+            "parameters.label, parameters.value, parameters.unit "
+            "FROM parameters "
+            "JOIN job_parameters ON job_parameters.run = parameters.run "
+            "AND job_parameters.parameter = parameters.id "
+            "JOIN jobs ON jobs.run = job_parameters.run AND jobs.id = job_parameters.job "
+            "JOIN runs ON runs.id = parameters.run "
+            f"WHERE {where} ORDER BY runs.created, jobs.start_time",
+            args,
+        )
+
+    def find_files(self, sha256: str) -> list:
+        """Return the runs and paths of all files with a checksum."""
+        return self._query(
+            "SELECT runs.hash AS run, files.path, files.size "
+            "FROM files JOIN runs ON runs.id = files.run "
+            "WHERE files.sha256 = ? ORDER BY runs.created",
+            (sha256,),
+        )
+
+    def rule_jobs(self, rule: str) -> list:
+        """Return the jobs of a rule across all runs."""
+        return self._query(
+            "SELECT runs.hash AS run, jobs.id AS job, jobs.label, "
+            "jobs.start_time, jobs.end_time "
+            "FROM jobs JOIN runs ON runs.id = jobs.run "
+            "WHERE jobs.rule = ? ORDER BY runs.created, jobs.start_time",
+            (rule,),
+        )
+
+    def _parameter_filter(self, label, value, unit):
+        where, args = ["parameters.label = ?"], [label]
+        if value is not None:
+            where.append("parameters.value = ?")
+            args.append(value)
+        if unit is not None:
+            where.append("parameters.unit = ?")
+            args.append(unit)
+        return " AND ".join(where), args
+
+    def _query(self, sql, args) -> list:
+        return [dict(row) for row in self.db.execute(sql, args)]
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # Without `finish`, e.g. after an error, the run is rolled back.
+        self.db.rollback()
+        self.close()
@@ -0,0 +1,189 @@
+import hashlib
+import json
+from tempfile import SpooledTemporaryFile
+
+SPOOL_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+# Node digests are combined by addition modulo 2**256, which does not depend
+# on the order in which the nodes are added.
+DIGEST_MODULUS = 1 << 256
+
+
+def node_digest(node: dict) -> int:
+    """Return the sha256 of the canonical form of a node, as an integer."""
+    canonical = json.dumps(node, sort_keys=True).encode("utf8")
+    return int.from_bytes(hashlib.sha256(canonical).digest(), "big")
+
+
+class _Section:
+    def __init__(self, text=True):
+        self.count = 0
+        self.text = (
+            SpooledTemporaryFile(SPOOL_SIZE, mode="w+", encoding="utf8")
+            if text
+            else None
+        )
+        # The file the text was suspended to, see `JsonLdGraphWriter.suspend`.
+        self.path = None
+
+    def suspend(self, path):
+        if self.text is None:
+            return
+        if self.path is None:
+            with open(path, "w", encoding="utf8", newline="") as f:
+                self.text.seek(0)
+                while chunk := self.text.read(CHUNK_SIZE):
+                    f.write(chunk)
+            self.path = path
+        self.text.close()
+        self.text = None
+
+    def resume(self):
+        if self.path is not None and self.text is None:
+            self.text = open(self.path, "a+", encoding="utf8", newline="")
+
+    def write(self, f):
+        if self.text is None:
+            with open(self.path, encoding="utf8", newline="") as text:
+                while chunk := text.read(CHUNK_SIZE):
+                    f.write(chunk)
+            return
+        self.text.seek(0)
+        while chunk := self.text.read(CHUNK_SIZE):
+            f.write(chunk)
+
+    def close(self):
+        if self.text is not None:
+            self.text.close()
+
+
+class JsonLdGraphWriter:
+    """
+    Stream the nodes of a JSON-LD `@graph` to disk as they are created.
+
+    Nodes are serialized on `add` into spooled temporary files, one per
+    section, so that only the caller's deduplication indexes have to stay in
+    memory. `write` assembles the document with the sections in the order
+    given to the constructor. The result is identical to `json.dump` of the
+    whole document with `indent=4`, or without any whitespace if `compact`
+    is set.
+
+    Writers that are only used for `hexdigest` can skip the document text
+    with `text=False`, and writers that are never hashed can skip the node
+    digests with `canonical=False`.
+    """
+
+    def __init__(self, sections, compact=False, text=True, canonical=True):
+        self.compact = compact
+        self.sections = {name: _Section(text) for name in sections}
+        self.canonical = canonical
+        self.digest = 0
+        self.spilled = None
+
+    def add(self, section, node: dict):
+        section = self.sections[section]
+        if section.text is not None:
+            if self.compact:
+                text = json.dumps(node, ensure_ascii=False, separators=(",", ":"))
+            else:
+                text = "        " + json.dumps(
+                    node, indent=4, ensure_ascii=False
+                ).replace("\n", "\n        ")
+            if section.count:
+                section.text.write("," if self.compact else ",\n")
+            section.text.write(text)
+        if self.canonical:
+            self.digest = (self.digest + node_digest(node)) % DIGEST_MODULUS
+        section.count += 1
+
+    def __len__(self):
+        return sum(section.count for section in self.sections.values())
+
+    def hexdigest(self, context: dict) -> str:
+        """
+        Return a sha256 of the document that depends only on the context and
+        the multiset of nodes, not on their order or section.
+
+        The digests of the canonical nodes, serialized with
+        `json.dumps(..., sort_keys=True)`, are summed as the nodes are added,
+        so the document is never serialized a second time.
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps(context, sort_keys=True).encode("utf8"))
+        digest.update(len(self).to_bytes(8, "big"))
+        digest.update(self.digest.to_bytes(32, "big"))
+        return digest.hexdigest()
+
+    def write(self, f, context: dict):
+        """Write the complete JSON-LD document to the text file object `f`."""
+        if self.compact:
+            f.write('{"@context":')
+            f.write(json.dumps(context, ensure_ascii=False, separators=(",", ":")))
+            f.write(',"@graph":[')
+            end = "]}"
+        else:
+            f.write('{\n    "@context": ')
+            f.write(
+                json.dumps(context, indent=4, ensure_ascii=False).replace(
+                    "\n", "\n    "
+                )
+            )
+            f.write(',\n    "@graph": [')
+            end = "\n    ]\n}" if len(self) else "]\n}"
+            if len(self):
+                f.write("\n")
+        if self.spilled:
+            with open(self.spilled, encoding="utf8", newline="") as graph:
+                while chunk := graph.read(CHUNK_SIZE):
+                    f.write(chunk)
+        else:
+            self._write_graph(f)
+        f.write(end)
+
+    def _write_graph(self, f):
+        separator = "," if self.compact else ",\n"
+        first = True
+        for section in self.sections.values():
+            if not section.count:
+                continue
+            if not first:
+                f.write(separator)
+            section.write(f)
+            first = False
+
+    def spill(self, path):
+        """
+        Move the `@graph` nodes written so far to the file `path` and free
+        the spools. No more nodes can be added afterwards, but `write` still
+        works. Use it to keep many finished writers without many open files.
+        """
+        with open(path, "w", encoding="utf8", newline="") as f:
+            self._write_graph(f)
+        self.close()
+        self.spilled = path
+
+    def suspend(self, base):
+        """
+        Move the nodes of every section to a file named `base` plus the
+        section name and close it, so that many idle writers hold neither
+        open files nor spools in memory. `resume` reopens the files to add
+        more nodes, and `write` works either way.
+        """
+        for name, section in self.sections.items():
+            section.suspend(f"{base}.{name}")
+
+    def resume(self):
+        for section in self.sections.values():
+            section.resume()
+
+    def close(self):
+        for section in self.sections.values():
+            section.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+
+import pytest
+
+from snakemake_report_plugin_metadat4ing import Reporter, ReportSettings
+
+
+class FakeDAGJob:
+    def __init__(self, jobid, rule, input, output, conda_env=None, shellcmd=None):
+        self.jobid = jobid
+        self.rule = SimpleNamespace(name=rule)
+        self.input = input
+        self.output = output
+        self.conda_env = conda_env
+        self.shellcmd = shellcmd
+
+    def __str__(self):
+        return self.rule.name
+
+
+class FakeDAG:
+    """Minimal stand-in for the Snakemake DAG that counts job iterations."""
+
+    def __init__(self, jobs):
+        self._jobs = jobs
+        self.job_iterations = 0
+
+    @property
+    def jobs(self):
+        for job in self._jobs:
+            self.job_iterations += 1
+            yield job
+
+    def toposorted(self):
+        levels = {}
+        for job in self._jobs:
+            levels.setdefault(job.rule.name, job)
+        return [[job] for job in levels.values()]
+
+
+def build_workflow(n_jobs, rules=("generate", "simulate")):
+    """
+    Build a chain of fake jobs where each job reads the output of the
+    previous one. Returns the DAG jobs, the job records and the files
+    that have to exist in the working directory.
+    """
+    dag_jobs, records, files = [], [], ["Snakefile"]
+    for jobid in range(n_jobs):
+        rule = rules[jobid % len(rules)]
+        input = [f"file_{jobid - 1}.json"] if jobid else []
+        output = [f"file_{jobid}.json"]
+        dag_job = FakeDAGJob(jobid, rule, input, output, shellcmd="echo")
+        dag_jobs.append(dag_job)
+        records.append(
+            SimpleNamespace(
+                job=dag_job,
+                rule=rule,
+                starttime=1_700_000_000 + jobid,
+                endtime=1_700_000_001 + jobid,
+                output=output,
+                conda_env_file=None,
+            )
+        )
+        files.extend(output)
+    return dag_jobs, records, files
+
+
+@pytest.fixture
+def make_reporter(tmp_path, tmp_path_factory, monkeypatch):
+    """Factory for a Reporter over a fake workflow, rendered inside tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path_factory.mktemp("cache")))
+
+    def factory(n_jobs, settings=None):
+        dag_jobs, records, files = build_workflow(n_jobs)
+        for name in files:
+            (tmp_path / name).write_text("{}")
+        return Reporter(
+            rules={},
+            results={},
+            configfiles=[],
+            jobs=records,
+            settings=settings or ReportSettings(),
+            workflow_description="",
+            dag=FakeDAG(dag_jobs),
+        )
+
+    return factory
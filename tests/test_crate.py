@@ -0,0 +1,39 @@
+import zipfile
+
+import pytest
+from rocrate.rocrate import ROCrate
+
+from snakemake_report_plugin_metadat4ing.crate import text_member, write_crate_zip
+
+
+@pytest.mark.parametrize("level", [0, 9])
+def test_compression_policy(tmp_path, level):
+    (tmp_path / "mesh.msh").write_bytes(b"\x00" * 10_000)
+    (tmp_path / "params.json").write_text('{"load": 1}' * 1_000)
+    crate = ROCrate()
+    crate.add_file(tmp_path / "mesh.msh", dest_path="mesh.msh")
+    crate.add_file(tmp_path / "params.json", dest_path="params.json")
+    crate.add_file(
+        None,
+        dest_path="provenance.ttl",
+        properties={"encodingFormat": "text/turtle"},
+    )
+
+    out = write_crate_zip(
+        crate,
+        tmp_path / "crate.zip",
+        {"provenance.ttl": text_member(lambda f: f.write("<a> <b> <c> .\n"))},
+        compression_level=level,
+    )
+
+    deflated = zipfile.ZIP_DEFLATED if level else zipfile.ZIP_STORED
+    with zipfile.ZipFile(out) as zf:
+        types = {info.filename: info.compress_type for info in zf.infolist()}
+        assert zf.read("provenance.ttl") == b"<a> <b> <c> .\n"
+        assert zf.read("mesh.msh") == b"\x00" * 10_000
+    assert types == {
+        "mesh.msh": zipfile.ZIP_STORED,
+        "params.json": deflated,
+        "provenance.ttl": deflated,
+        "ro-crate-metadata.json": deflated,
+    }
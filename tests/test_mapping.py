@@ -0,0 +1,199 @@
+import json
+import zipfile
+
+import pytest
+
+from snakemake_report_plugin_metadat4ing import ReportSettings
+from snakemake_report_plugin_metadat4ing import mapping as mapping_module
+from snakemake_report_plugin_metadat4ing.mapping import MappingExtractor
+
+MAPPING = {
+    "parameters": [
+        {
+            "rule": "generate*",
+            "files": "parameters_*.json",
+            "values": {
+                "load": {"pointer": "/load/value", "unit": "units:MegaPA"},
+                "order": "/element-order",
+                "first": "/list/0",
+                "escaped": "/a~1b/c~0d",
+                "missing": "/not/there",
+                "null": "/nothing",
+                "list": "/list",
+                "object": "/load",
+            },
+        },
+        {
+            "files": "parameters_*.json",
+            "values": {"flag": {"pointer": "/flag", "data-type": "schema:Text"}},
+        },
+    ],
+    "tools": {"fenics-dolfinx": "FEniCS"},
+}
+
+PARAMETERS = {
+    "load": {"value": 200.0, "unit": "MPa"},
+    "element-order": 2,
+    "list": ["gauss"],
+    "a/b": {"c~d": True},
+    "flag": False,
+    "nothing": None,
+}
+
+
+@pytest.fixture
+def parameters_file(tmp_path):
+    path = tmp_path / "parameters_1.json"
+    path.write_text(json.dumps(PARAMETERS))
+    return str(path)
+
+
+def test_mapping_extracts_pointers(parameters_file):
+    result = MappingExtractor(MAPPING).extract_params("generate", parameters_file)
+    assert result == {
+        "load": {
+            "value": 200.0,
+            "unit": "units:MegaPA",
+            "json-path": "/load/value",
+            "data-type": "schema:Float",
+        },
+        "order": {
+            "value": 2,
+            "unit": None,
+            "json-path": "/element-order",
+            "data-type": "schema:Integer",
+        },
+        "first": {
+            "value": "gauss",
+            "unit": None,
+            "json-path": "/list/0",
+            "data-type": "schema:Text",
+        },
+        "escaped": {
+            "value": True,
+            "unit": None,
+            "json-path": "/a~1b/c~0d",
+            "data-type": "schema:Boolean",
+        },
+        "flag": {
+            "value": False,
+            "unit": None,
+            "json-path": "/flag",
+            "data-type": "schema:Text",
+        },
+    }
+
+
+def test_mapping_matches_rules_and_files(parameters_file):
+    extractor = MappingExtractor(MAPPING)
+    assert list(extractor.extract_params("summary", parameters_file)) == ["flag"]
+    assert extractor.extract_params("generate", "summary_1.json") == {}
+
+
+def test_mapping_parses_each_file_once(parameters_file, monkeypatch):
+    loaded = []
+    load_document = mapping_module._load_document
+    monkeypatch.setattr(
+        mapping_module,
+        "_load_document",
+        lambda path: loaded.append(path) or load_document(path),
+    )
+    extractor = MappingExtractor(MAPPING)
+    results = extractor.extract_params_batch(
+        [("generate", parameters_file), ("summary", parameters_file)]
+    )
+    assert len(results[("generate", parameters_file)]) == 5
+    again = extractor.extract_params("generate", parameters_file)
+    assert again == results[("generate", parameters_file)]
+    assert loaded == [parameters_file]
+
+    # A changed file is parsed again.
+    with open(parameters_file, "a") as f:
+        f.write("\n")
+    extractor.extract_params_batch([("generate", parameters_file)])
+    assert loaded == [parameters_file, parameters_file]
+
+
+def test_mapping_extracts_tools():
+    environment = (
+        b"dependencies:\n  - fenics-dolfinx=0.9.0\n  - python\n  - pip:\n    - numpy\n"
+    )
+    assert MappingExtractor(MAPPING).extract_tools("simulate", environment) == {
+        "FEniCS": "=0.9.0"
+    }
+
+
+def test_mapping_rejects_invalid_pointers():
+    with pytest.raises(ValueError, match="must start with '/'"):
+        MappingExtractor({"parameters": [{"files": "*", "values": {"x": "x"}}]})
+
+
+@pytest.mark.parametrize(
+    "parameters", [{"files": "*"}, "*.json", [["*.json"]]], ids=["dict", "str", "list"]
+)
+def test_mapping_rejects_invalid_parameters(parameters):
+    with pytest.raises(TypeError, match="must be a"):
+        MappingExtractor({"parameters": parameters})
+
+
+def test_mapping_skips_values_without_scalar_type(make_reporter, tmp_path):
+    script = tmp_path / "mapping.json"
+    script.write_text(
+        json.dumps(
+            {
+                "parameters": [
+                    {
+                        "files": "file_*.json",
+                        "values": {
+                            "null": "/null",
+                            "list": "/list",
+                            "object": "/object",
+                            "job": "/job",
+                        },
+                    }
+                ]
+            }
+        )
+    )
+    reporter = make_reporter(2, ReportSettings(paramscript=script))
+    for i in range(2):
+        (tmp_path / f"file_{i}.json").write_text(
+            json.dumps({"null": None, "list": [1, 2], "object": {"a": 1}, "job": i})
+        )
+    reporter.render()
+
+    crate = tmp_path / f"ro-crate-metadata-{reporter.simulation_hash}.zip"
+    with zipfile.ZipFile(crate) as zf:
+        graph = json.loads(zf.read("provenance.jsonld"))["@graph"]
+    labels = {
+        node["label"]
+        for node in graph
+        if node["@type"] in ("numerical variable", "text variable")
+    }
+    assert labels == {"job"}
+
+
+def test_mapping_file_as_paramscript(make_reporter, tmp_path):
+    script = tmp_path / "mapping.yaml"
+    script.write_text(
+        "parameters:\n"
+        "  - rule: simulate\n"
+        "    files: 'file_*.json'\n"
+        "    values:\n"
+        "      job: {pointer: /job, unit: 'units:NUM'}\n"
+    )
+    reporter = make_reporter(4, ReportSettings(paramscript=script, workers=2))
+    for name in ("file_0.json", "file_1.json", "file_2.json", "file_3.json"):
+        (tmp_path / name).write_text(json.dumps({"job": int(name[5])}))
+    reporter.render()
+    assert isinstance(reporter.extractor, MappingExtractor)
+
+    crate = tmp_path / f"ro-crate-metadata-{reporter.simulation_hash}.zip"
+    with zipfile.ZipFile(crate) as zf:
+        graph = json.loads(zf.read("provenance.jsonld"))["@graph"]
+    values = sorted(
+        (node["has numerical value"], node["has unit"]["@id"])
+        for node in graph
+        if node["@type"] == "numerical variable"
+    )
+    assert values == [(i, "units:NUM") for i in range(4)]
@@ -0,0 +1,64 @@
+import json
+
+from snakemake_report_plugin_metadat4ing.nodes import (
+    FieldNode,
+    FileNode,
+    JobNode,
+    NodeIds,
+    ParamNode,
+    ToolNode,
+)
+
+
+def test_nodes_materialize_to_graph_layout():
+    ids = NodeIds()
+    step = ids.add("local:simulate")
+    file = ids.add("mesh.msh")
+    param = ids.add("local:variable_length_0")
+    tool = ids.add("local:tool_0")
+
+    job = JobNode("local:processing_step_1", "simulate_1", step, "t0", "t1")
+    job.inputs.append(file)
+    job.parameters.append(param)
+    job.tools.append(tool)
+    assert list(job.to_dict(ids)) == [
+        "@id",
+        "@type",
+        "label",
+        "part of",
+        "start time",
+        "end time",
+        "has input",
+        "has output",
+        "has parameter",
+        "has employed tool",
+    ]
+    assert job.to_dict(ids)["has input"] == [{"@id": "mesh.msh"}]
+    assert job.to_dict(ids)["has output"] == []
+
+    assert json.dumps(
+        ParamNode(param, "length", 2.5, "units:M", False).to_dict(ids)
+    ) == (
+        '{"@type": "numerical variable", "label": "length", '
+        '"has numerical value": 2.5, "has unit": {"@id": "units:M"}, '
+        '"@id": "local:variable_length_0"}'
+    )
+    assert FileNode(file).to_dict(ids) == {
+        "@id": "mesh.msh",
+        "@type": "cr:FileObject",
+        "label": "mesh.msh",
+    }
+    assert FieldNode("local:field_length_0", param, file, "/l", "").to_dict(ids) == {
+        "@id": "local:field_length_0",
+        "@type": "Field",
+        "represents": {"@id": "local:variable_length_0"},
+        "source": {
+            "file object": {"@id": "mesh.msh"},
+            "cr:extract": {"cr:jsonPath": "/l"},
+        },
+    }
+    assert ToolNode(tool, "FEniCS", None).to_dict(ids) == {
+        "@id": "local:tool_0",
+        "@type": "schema:SoftwareApplication",
+        "label": "FEniCS",
+    }
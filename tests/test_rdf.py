@@ -0,0 +1,92 @@
+import io
+import json
+import zipfile
+from pathlib import Path
+
+import pytest
+from rdflib import Dataset, Graph
+from rdflib.compare import isomorphic
+
+from snakemake_report_plugin_metadat4ing.rdf import (
+    NTriplesGraphWriter,
+    RdfConverter,
+    TurtleGraphWriter,
+)
+
+EXAMPLES = Path(__file__).parents[1] / "examples" / "benchmarks"
+BASE = "file:///workflow/"
+
+
+def _example_provenance(name):
+    (crate,) = (EXAMPLES / name).glob("ro-crate-metadata-*.zip")
+    with zipfile.ZipFile(crate) as zf:
+        return json.loads(zf.read("provenance.jsonld"))
+
+
+def _turtle(document, writer_class=TurtleGraphWriter, **kwargs):
+    context = dict(document["@context"])
+    local = context.pop("local")
+    with writer_class(RdfConverter(context, BASE), **kwargs) as writer:
+        for node in document["@graph"]:
+            writer.add(node)
+        f = io.StringIO()
+        writer.write(f, local)
+    return f.getvalue()
+
+
+@pytest.mark.parametrize("example", ["Fenics", "Kratos"])
+def test_turtle_isomorphic_to_rdflib(example):
+    document = _example_provenance(example)
+    expected = Graph().parse(
+        data=json.dumps(document), format="json-ld", publicID=BASE + "provenance"
+    )
+    actual = Graph().parse(data=_turtle(document), format="turtle")
+    assert len(actual) == len(expected)
+    assert isomorphic(actual, expected)
+
+
+def test_turtle_literals_and_escaping():
+    document = {
+        "@context": {
+            "local": "https://local-domain.org/abc/",
+            "schema": "https://schema.org/",
+            "xsd": "http://www.w3.org/2001/XMLSchema#",
+            "text": {"@id": "schema:text", "@type": "xsd:string"},
+        },
+        "@graph": [
+            {
+                "@id": "local:node(1)",
+                "text": 'quote " backslash \\ newline \n nul \x00',
+                "schema:flag": True,
+                "schema:values": [1, 2.5, 1e-07],
+                "schema:nested": {"schema:deep": {"@id": "local:other"}},
+            }
+        ],
+    }
+    expected = Graph().parse(data=json.dumps(document), format="json-ld", publicID=BASE)
+    actual = Graph().parse(data=_turtle(document), format="turtle")
+    assert isomorphic(actual, expected)
+
+
+@pytest.mark.parametrize("example", ["Fenics", "Kratos"])
+def test_ntriples_isomorphic_to_rdflib(example):
+    document = _example_provenance(example)
+    expected = Graph().parse(
+        data=json.dumps(document), format="json-ld", publicID=BASE + "provenance"
+    )
+    actual = Graph().parse(data=_turtle(document, NTriplesGraphWriter), format="nt")
+    assert len(actual) == len(expected)
+    assert isomorphic(actual, expected)
+
+
+def test_nquads_use_local_namespace_as_graph():
+    document = _example_provenance("Fenics")
+    local = document["@context"]["local"]
+    expected = Graph().parse(
+        data=json.dumps(document), format="json-ld", publicID=BASE + "provenance"
+    )
+    nquads = _turtle(document, NTriplesGraphWriter, quads=True)
+    assert all(line.endswith(f" <{local}> .") for line in nquads.splitlines())
+    dataset = Dataset()
+    dataset.parse(data=nquads, format="nquads")
+    assert isomorphic(dataset.graph(local), expected)
@@ -0,0 +1,845 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import pstats
+import threading
+import time
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import snakemake_report_plugin_metadat4ing as plugin
+from snakemake_report_plugin_metadat4ing import ReportSettings
+from snakemake_report_plugin_metadat4ing.cache import ReportCache
+from snakemake_report_plugin_metadat4ing.store import ProvenanceStore
+
+
+@pytest.mark.parametrize("n_jobs", [10, 100])
+def test_render_scans_dag_jobs_once(make_reporter, n_jobs):
+    reporter = make_reporter(n_jobs)
+    reporter.render()
+    assert reporter.dag.job_iterations == n_jobs
+    assert len(reporter.job_index) == n_jobs
+
+
+EXTRACTOR_SCRIPT = """
+from snakemake_report_plugin_metadat4ing.interfaces import (
+    ParameterExtractorInterface,
+)
+
+with open("imports.log", "a") as f:
+    f.write("{marker}\\n")
+
+
+class Extractor(ParameterExtractorInterface):
+    def extract_params(self, rule_name, file_path):
+        return {{}}
+
+    def extract_tools(self, rule_name, env_file_content):
+        return {{}}
+"""
+
+
+def test_extractor_script_imported_once(make_reporter, tmp_path):
+    script = tmp_path / "extractor.py"
+    script.write_text(EXTRACTOR_SCRIPT.format(marker="v1"))
+    reporter = make_reporter(20, ReportSettings(paramscript=script))
+
+    reporter.render()
+    assert (tmp_path / "imports.log").read_text().split() == ["v1"]
+
+    reporter.render()
+    assert (tmp_path / "imports.log").read_text().split() == ["v1"]
+
+    script.write_text(EXTRACTOR_SCRIPT.format(marker="v2-edited"))
+    reporter.render()
+    assert (tmp_path / "imports.log").read_text().split() == ["v1", "v2-edited"]
+
+
+def test_param_key_matches_dict_equality(make_reporter):
+    reporter = make_reporter(1)
+    a = {"label": "load", "has numerical value": 1, "has unit": {"@id": "u"}}
+    b = {"has unit": {"@id": "u"}, "label": "load", "has numerical value": 1.0}
+    c = {"label": "load", "has numerical value": [1, 2]}
+    d = {"label": "load", "has numerical value": [2, 1]}
+    assert reporter._param_key(a) == reporter._param_key(b)
+    assert reporter._param_key(c) != reporter._param_key(d)
+    assert len({reporter._param_key(param) for param in (a, b, c, d)}) == 3
+
+
+DEDUP_EXTRACTOR_SCRIPT = """
+from snakemake_report_plugin_metadat4ing.interfaces import (
+    ParameterExtractorInterface,
+)
+
+
+class Extractor(ParameterExtractorInterface):
+    def extract_params(self, rule_name, file_path):
+        is_text = rule_name == "simulate"
+        return {
+            "load": {
+                "value": 200.0,
+                "unit": "units:MegaPA",
+                "json-path": "/load",
+                "data-type": "schema:Float",
+            },
+            "level": {
+                "value": "1" if is_text else 1,
+                "unit": None,
+                "json-path": "/level",
+                "data-type": "schema:Text" if is_text else "schema:Integer",
+            },
+        }
+
+    def extract_tools(self, rule_name, env_file_content):
+        return {}
+"""
+
+
+def test_identical_parameters_share_one_node(make_reporter, tmp_path):
+    script = tmp_path / "extractor.py"
+    script.write_text(DEDUP_EXTRACTOR_SCRIPT)
+    reporter = make_reporter(10, ReportSettings(paramscript=script))
+    reporter.render()
+    crate = f"ro-crate-metadata-{reporter.simulation_hash}.zip"
+    with zipfile.ZipFile(crate) as zf:
+        graph = json.loads(zf.read("provenance.jsonld"))["@graph"]
+
+    params = {
+        node["@id"]: node
+        for node in graph
+        if node["@type"] in ("numerical variable", "text variable")
+    }
+    loads = [node for node in params.values() if node["label"] == "load"]
+    assert len(loads) == 1
+    levels = sorted(
+        (node["@type"], node.get("has numerical value", node.get("has string value")))
+        for node in params.values()
+        if node["label"] == "level"
+    )
+    assert levels == [("numerical variable", 1), ("text variable", "1")]
+
+    # Parameters of input files are linked to every job reading them.
+    jobs = [node for node in graph if node.get("has input")]
+    assert len(jobs) == 9
+    for job in jobs:
+        refs = {ref["@id"] for ref in job["has parameter"]}
+        assert loads[0]["@id"] in refs
+        assert refs <= set(params)
+
+
+class FakeResponse:
+    def __init__(self, status_code, context=None, headers=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = headers or {}
+        self._context = context
+
+    def json(self):
+        return self._context
+
+
+def test_context_offline_uses_bundled_copy(make_reporter, monkeypatch):
+    def no_network(*args, **kwargs):
+        raise AssertionError("network used without context_online")
+
+    monkeypatch.setattr(requests, "get", no_network)
+    reporter = make_reporter(1)
+    reporter._get_context()
+    assert reporter.context_data["@context"]["m4i"] == (
+        "http://w3id.org/nfdi4ing/metadata4ing#"
+    )
+
+
+def test_context_pinned_path(make_reporter, tmp_path):
+    pinned = tmp_path / "context.jsonld"
+    pinned.write_text(json.dumps({"@context": {"m4i": "urn:pinned#"}}))
+    reporter = make_reporter(1, ReportSettings(context=pinned))
+    reporter._get_context()
+    assert reporter.context_data == {"@context": {"m4i": "urn:pinned#"}}
+
+
+def test_context_online_revalidates_cache(make_reporter, monkeypatch):
+    calls = []
+    responses = [
+        FakeResponse(200, {"@context": {"m4i": "urn:remote#"}}, {"ETag": '"v1"'}),
+        FakeResponse(304),
+    ]
+
+    def fake_get(url, headers, timeout):
+        calls.append(headers)
+        return responses.pop(0)
+
+    monkeypatch.setattr(requests, "get", fake_get)
+    reporter = make_reporter(1, ReportSettings(context_online=True))
+    reporter._get_context()
+    reporter._get_context()
+    assert calls == [{}, {"If-None-Match": '"v1"'}]
+    assert reporter.context_data == {"@context": {"m4i": "urn:remote#"}}
+
+
+def test_context_corrupt_headers_cache_is_refetched(make_reporter, monkeypatch):
+    calls = []
+
+    def fake_get(url, headers, timeout):
+        calls.append(headers)
+        return FakeResponse(200, {"@context": {"m4i": "urn:new#"}}, {"ETag": '"v2"'})
+
+    monkeypatch.setattr(requests, "get", fake_get)
+    reporter = make_reporter(1, ReportSettings(context_online=True))
+    cache_file = reporter._cache_dir() / "m4i2rocrate_context.jsonld"
+    cache_file.parent.mkdir(parents=True)
+    cache_file.write_text('{"@context": {"m4i": "urn:old#"}}')
+    cache_file.with_suffix(".headers.json").write_text('{"etag": "v')
+    reporter._get_context()
+    assert calls == [{}]
+    assert reporter.context_data == {"@context": {"m4i": "urn:new#"}}
+
+
+PARAM_EXTRACTOR_SCRIPT = """
+import re
+from snakemake_report_plugin_metadat4ing.interfaces import (
+    ParameterExtractorInterface,
+)
+
+
+class Extractor(ParameterExtractorInterface):
+    def extract_params(self, rule_name, file_path):
+        index = int(re.search(r"\\d+", file_path).group())
+        return {
+            "bucket": {
+                "value": index % 7,
+                "unit": "units:m",
+                "json-path": "/bucket",
+                "data-type": "schema:Integer",
+            },
+            "rule": {
+                "value": rule_name,
+                "unit": None,
+                "json-path": "/rule",
+                "data-type": "schema:Text",
+            },
+        }
+
+    def extract_tools(self, rule_name, env_file_content):
+        return {}
+"""
+
+
+def _rendered_provenance(reporter):
+    reporter.render()
+    crate = f"ro-crate-metadata-{reporter.simulation_hash}.zip"
+    with zipfile.ZipFile(crate) as zf:
+        return zf.read("provenance.jsonld")
+
+
+def test_parallel_extraction_matches_serial(make_reporter, tmp_path):
+    script = tmp_path / "extractor.py"
+    script.write_text(PARAM_EXTRACTOR_SCRIPT)
+
+    serial = _rendered_provenance(make_reporter(40, ReportSettings(paramscript=script)))
+    for worker_type in ("thread", "process"):
+        settings = ReportSettings(
+            paramscript=script, workers=4, worker_type=worker_type
+        )
+        assert _rendered_provenance(make_reporter(40, settings)) == serial
+    assert b"local:variable_bucket_6" in serial
+
+
+BATCH_EXTRACTOR_SCRIPT = (
+    PARAM_EXTRACTOR_SCRIPT.replace(
+        "class Extractor(ParameterExtractorInterface):",
+        "class PerFileExtractor(ParameterExtractorInterface):",
+    )
+    + """
+
+class Extractor(PerFileExtractor):
+    batches = []
+
+    def extract_params(self, rule_name, file_path):
+        raise AssertionError("per-file extraction used for batch extractor")
+
+    def extract_params_batch(self, items):
+        Extractor.batches.append(len(items))
+        return {
+            item: PerFileExtractor.extract_params(self, *item) for item in items
+        }
+"""
+)
+
+
+def test_batch_extraction_is_preferred(make_reporter, tmp_path):
+    per_file_script = tmp_path / "per_file.py"
+    per_file_script.write_text(PARAM_EXTRACTOR_SCRIPT)
+    batch_script = tmp_path / "batch.py"
+    batch_script.write_text(BATCH_EXTRACTOR_SCRIPT)
+
+    expected = _rendered_provenance(
+        make_reporter(30, ReportSettings(paramscript=per_file_script))
+    )
+    reporter = make_reporter(30, ReportSettings(paramscript=batch_script, workers=2))
+    assert _rendered_provenance(reporter) == expected
+    assert type(reporter.extractor).batches == [30, 29]
+
+
+@pytest.mark.parametrize("worker_type", ["thread", "process"])
+def test_params_are_extracted_in_windows(
+    make_reporter, tmp_path, monkeypatch, worker_type
+):
+    script = tmp_path / "batch.py"
+    script.write_text(BATCH_EXTRACTOR_SCRIPT)
+    settings = ReportSettings(
+        paramscript=script, workers=2, worker_type=worker_type, param_cache_size=0
+    )
+    expected = _rendered_provenance(make_reporter(30, settings))
+
+    monkeypatch.setattr(plugin, "EXTRACTION_WINDOW", 4)
+    reporter = make_reporter(30, settings)
+    held = []
+    create_job_node = reporter._create_job_node
+
+    def recording_create_job_node(*args):
+        held.append(len(reporter.extracted_params))
+        return create_job_node(*args)
+
+    monkeypatch.setattr(reporter, "_create_job_node", recording_create_job_node)
+    assert _rendered_provenance(reporter) == expected
+    # Only the results of the current window and the next job's input are held.
+    assert max(held) <= 9
+    assert reporter.extracted_params == {}
+
+
+def test_render_leaves_only_the_crate_in_the_workdir(make_reporter, tmp_path):
+    reporter = make_reporter(3)
+    before = set(tmp_path.iterdir())
+    reporter.render()
+    crate = tmp_path / f"ro-crate-metadata-{reporter.simulation_hash}.zip"
+    assert set(tmp_path.iterdir()) - before == {crate}
+    with zipfile.ZipFile(crate) as zf:
+        assert {"provenance.jsonld", "provenance.ttl"} <= set(zf.namelist())
+
+
+def test_file_checksums_are_cached(make_reporter, tmp_path, monkeypatch):
+    reporter = make_reporter(5, ReportSettings(checksum_workers=2))
+    (tmp_path / "file_2.json").write_text('{"a": 1}')
+    hashed = []
+    file_sha256 = reporter._file_sha256
+
+    def counting_sha256(path):
+        hashed.append(path)
+        return file_sha256(path)
+
+    monkeypatch.setattr(reporter, "_file_sha256", counting_sha256)
+    document = json.loads(_rendered_provenance(reporter))
+    file_node = next(n for n in document["@graph"] if n["@id"] == "file_2.json")
+    assert file_node["schema:contentSize"] == "8"
+    assert file_node["schema:sha256"] == hashlib.sha256(b'{"a": 1}').hexdigest()
+    with zipfile.ZipFile(f"ro-crate-metadata-{reporter.simulation_hash}.zip") as zf:
+        metadata = json.loads(zf.read("ro-crate-metadata.json"))
+    entity = next(e for e in metadata["@graph"] if e["@id"] == "file_2.json")
+    assert entity["sha256"] == file_node["schema:sha256"]
+    assert sorted(hashed) == [f"file_{i}.json" for i in range(5)]
+
+    hashed.clear()
+    reporter.render()
+    assert hashed == []
+
+    (tmp_path / "file_3.json").write_text('{"b": 2}')
+    reporter.render()
+    assert hashed == ["file_3.json"]
+
+
+def test_file_metadata_is_gathered_concurrently(make_reporter, monkeypatch):
+    reporter = make_reporter(20, ReportSettings(metadata_concurrency=3))
+    stat_file = plugin.stat_file
+    lock, running, peak = threading.Lock(), [0], [0]
+
+    def tracking_stat_file(path):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return stat_file(path)
+
+    monkeypatch.setattr(plugin, "stat_file", tracking_stat_file)
+
+    async def render_in_event_loop():
+        # Snakemake renders reports from within its own event loop.
+        reporter.render()
+
+    asyncio.run(render_in_event_loop())
+    assert 1 < peak[0] <= 3
+    assert set(reporter.file_info) == {f"file_{i}.json" for i in range(20)}
+    with zipfile.ZipFile(f"ro-crate-metadata-{reporter.simulation_hash}.zip") as zf:
+        metadata = json.loads(zf.read("ro-crate-metadata.json"))
+    entity = next(e for e in metadata["@graph"] if e["@id"] == "file_7.json")
+    assert entity["encodingFormat"] == "application/json"
+    assert entity["contentSize"] == "2"
+
+
+SIZE_EXTRACTOR_SCRIPT = """
+import os
+from snakemake_report_plugin_metadat4ing.interfaces import (
+    ParameterExtractorInterface,
+)
+
+
+class Extractor(ParameterExtractorInterface):
+    calls = []
+
+    def extract_params(self, rule_name, file_path):
+        Extractor.calls.append((rule_name, file_path))
+        return {
+            "size": {
+                "value": os.path.getsize(file_path),
+                "unit": "units:BYTE",
+                "json-path": "/",
+                "data-type": "schema:Integer",
+            },
+        }
+
+    def extract_tools(self, rule_name, env_file_content):
+        return {}
+"""
+
+
+def test_incremental_report_reextracts_changed_jobs(make_reporter, tmp_path):
+    script = tmp_path / "extractor.py"
+    script.write_text(SIZE_EXTRACTOR_SCRIPT)
+    reporter = make_reporter(
+        20, ReportSettings(paramscript=script, incremental=True, param_cache_size=0)
+    )
+
+    first = _rendered_provenance(reporter)
+    calls = type(reporter.extractor).calls
+    assert len(calls) == 39
+
+    calls.clear()
+    assert _rendered_provenance(reporter) == first
+    assert calls == []
+
+    (tmp_path / "file_5.json").write_text('{"changed": true}')
+    incremental = _rendered_provenance(reporter)
+    assert sorted(calls) == sorted(
+        [
+            ("simulate", "file_4.json"),
+            ("simulate", "file_5.json"),
+            ("generate", "file_5.json"),
+            ("generate", "file_6.json"),
+        ]
+    )
+    assert incremental != first
+
+    reporter.settings = ReportSettings(paramscript=script, param_cache_size=0)
+    assert _rendered_provenance(reporter) == incremental
+
+
+def test_extracted_params_are_cached(make_reporter, tmp_path):
+    script = tmp_path / "extractor.py"
+    script.write_text(SIZE_EXTRACTOR_SCRIPT)
+    reporter = make_reporter(20, ReportSettings(paramscript=script))
+
+    first = _rendered_provenance(reporter)
+    calls = type(reporter.extractor).calls
+    assert len(calls) == 39
+
+    calls.clear()
+    assert _rendered_provenance(reporter) == first
+    assert calls == []
+
+    (tmp_path / "file_5.json").write_text('{"changed": true}')
+    changed = _rendered_provenance(reporter)
+    assert sorted(calls) == [("generate", "file_5.json"), ("simulate", "file_5.json")]
+    assert changed != first
+
+    # A new extractor script invalidates all results.
+    script.write_text(SIZE_EXTRACTOR_SCRIPT + "\n# changed\n")
+    assert _rendered_provenance(reporter) == changed
+    assert len(type(reporter.extractor).calls) == 39
+
+
+TUPLE_EXTRACTOR_SCRIPT = """
+from snakemake_report_plugin_metadat4ing.interfaces import (
+    ParameterExtractorInterface,
+)
+
+
+class Extractor(ParameterExtractorInterface):
+    def extract_params(self, rule_name, file_path):
+        return {
+            "mesh": {
+                "value": ("gmsh", 2),
+                "unit": None,
+                "json-path": "/mesh",
+                "data-type": "schema:Text",
+            },
+        }
+
+    def extract_tools(self, rule_name, env_file_content):
+        return {}
+"""
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_warm_render_with_tuple_values_matches_fresh(
+    make_reporter, tmp_path, incremental
+):
+    script = tmp_path / "extractor.py"
+    script.write_text(TUPLE_EXTRACTOR_SCRIPT)
+    reporter = make_reporter(
+        10, ReportSettings(paramscript=script, incremental=incremental)
+    )
+    cold = _rendered_provenance(reporter)
+    assert _rendered_provenance(reporter) == cold
+
+    # Now results of unchanged files are reused next to fresh ones.
+    (tmp_path / "file_5.json").write_text('{"changed": true}')
+    warm = _rendered_provenance(reporter)
+    warm_hash = reporter.simulation_hash
+    graph = json.loads(warm)["@graph"]
+    assert sum(node["@type"] == "text variable" for node in graph) == 1
+
+    reporter.settings = ReportSettings(paramscript=script, param_cache_size=0)
+    assert _rendered_provenance(reporter) == warm
+    assert reporter.simulation_hash == warm_hash
+
+
+def test_unusable_cache_dir_falls_back_to_memory(make_reporter, tmp_path, capsys):
+    (tmp_path / "not-a-dir").write_text("")
+    reporter = make_reporter(
+        3, ReportSettings(cachedir=tmp_path / "not-a-dir" / "cache")
+    )
+    reporter.render()
+    assert "caching in memory only" in capsys.readouterr().out
+    assert (tmp_path / f"ro-crate-metadata-{reporter.simulation_hash}.zip").exists()
+
+
+def test_param_cache_evicts_least_recently_used(tmp_path):
+    with ReportCache(tmp_path / "cache.sqlite") as cache:
+        params = {"size": {"value": 1}}
+        size = len(json.dumps(params))
+        keys = [("rule", f"file_{i}", "sha", "ext") for i in range(5)]
+        for key in keys:
+            cache.set_params({key: params})
+        cache.evict_params(5 * size)
+        assert set(cache.get_params(keys)) == set(keys)
+        cache.get_params(keys[:1])
+        cache.evict_params(3 * size)
+        assert set(cache.get_params(keys)) == {keys[0], keys[3], keys[4]}
+        assert cache.get_params([("rule", "file_4", "other", "ext")]) == {}
+
+
+def test_large_files_are_referenced_only(make_reporter, tmp_path):
+    settings = ReportSettings(reference_size=10, reference_glob=["file_4.*"])
+    reporter = make_reporter(5, settings)
+    (tmp_path / "file_2.json").write_text('{"large": true}')
+    reporter.render()
+
+    with zipfile.ZipFile(f"ro-crate-metadata-{reporter.simulation_hash}.zip") as zf:
+        names = set(zf.namelist())
+        metadata = json.loads(zf.read("ro-crate-metadata.json"))
+    assert {"file_0.json", "file_1.json", "file_3.json"} <= names
+    assert not {"file_2.json", "file_4.json"} & names
+
+    entities = {entity["@id"]: entity for entity in metadata["@graph"]}
+    reference = entities["file_2.json"]
+    assert reference["contentUrl"] == (tmp_path / "file_2.json").as_uri()
+    assert reference["contentSize"] == "15"
+    assert reference["sha256"] == hashlib.sha256(b'{"large": true}').hexdigest()
+    assert reference["encodingFormat"] == "application/json"
+    assert entities["file_4.json"]["contentUrl"] == (tmp_path / "file_4.json").as_uri()
+
+
+TOOL_EXTRACTOR_SCRIPT = """
+from snakemake_report_plugin_metadat4ing.interfaces import (
+    ParameterExtractorInterface,
+)
+
+
+class Extractor(ParameterExtractorInterface):
+    calls = []
+
+    def extract_params(self, rule_name, file_path):
+        return {}
+
+    def extract_tools(self, rule_name, env_file_content):
+        Extractor.calls.append(env_file_content)
+        name = env_file_content.decode().split()[-1]
+        return {name: "1.0"}
+"""
+
+
+def test_tools_are_extracted_once_per_env(make_reporter, tmp_path):
+    script = tmp_path / "extractor.py"
+    script.write_text(TOOL_EXTRACTOR_SCRIPT)
+    envs = [SimpleNamespace(content=f"- {name}".encode()) for name in ("a", "b")]
+
+    def render(n_jobs=10):
+        reporter = make_reporter(n_jobs, ReportSettings(paramscript=script))
+        for dag_job in reporter.dag._jobs:
+            dag_job.conda_env = envs[dag_job.jobid % 2]
+        document = json.loads(_rendered_provenance(reporter))
+        return reporter, document["@graph"]
+
+    reporter, graph = render()
+    assert type(reporter.extractor).calls == [b"- a", b"- b"]
+    tools = [
+        node["@id"] for node in graph if node["@type"] == "schema:SoftwareApplication"
+    ]
+    assert tools == ["local:tool_0", "local:tool_1"]
+    jobs = [node for node in graph if node["@id"].startswith("local:processing_step_")]
+    assert [job["has employed tool"] for job in jobs[:3]] == [
+        [{"@id": "local:tool_0"}],
+        [{"@id": "local:tool_1"}],
+        [{"@id": "local:tool_0"}],
+    ]
+
+    type(reporter.extractor).calls.clear()
+    reporter, second_graph = render()
+    assert type(reporter.extractor).calls == []
+    assert second_graph == graph
+
+
+class FakeSourceFile:
+    def __init__(self, path):
+        self.path = str(path)
+
+    def get_path_or_uri(self, secret_free):
+        return self.path
+
+
+def test_workflow_sources_are_added_once(make_reporter, tmp_path, monkeypatch):
+    (tmp_path / "rules").mkdir()
+    (tmp_path / "rules" / "extra.smk").write_text("")
+    (tmp_path / "scripts").mkdir()
+    (tmp_path / "scripts" / "plot.py").write_text("")
+    (tmp_path / "run.sh").write_text("")
+    workflow = SimpleNamespace(
+        included=[
+            FakeSourceFile(tmp_path / "Snakefile"),
+            FakeSourceFile(tmp_path / "rules" / "extra.smk"),
+        ]
+    )
+    reporter = make_reporter(20)
+    for dag_job in reporter.dag._jobs:
+        dag_job.rule.workflow = workflow
+        if dag_job.rule.name == "generate":
+            dag_job.rule.script = "scripts/plot.py"
+            dag_job.rule.basedir = FakeSourceFile(tmp_path)
+        else:
+            dag_job.shellcmd = f"bash run.sh {dag_job.jobid}"
+
+    monkeypatch.setattr(type(reporter), "_find_snakefile", None)
+    reporter.render()
+    with zipfile.ZipFile(f"ro-crate-metadata-{reporter.simulation_hash}.zip") as zf:
+        names = zf.namelist()
+    for source in ("Snakefile", "rules/extra.smk", "scripts/plot.py", "run.sh"):
+        assert names.count(source) == 1
+    assert reporter.dag.job_iterations == 20
+    assert reporter.job_index[0]["script"] == "scripts/plot.py"
+    assert reporter.job_index[1]["script"] == "run.sh"
+
+
+def test_shell_scripts_keep_their_path(make_reporter, tmp_path):
+    (tmp_path / "scripts").mkdir()
+    (tmp_path / "scripts" / "run.sh").write_text("")
+    reporter = make_reporter(4)
+    for dag_job in reporter.dag._jobs:
+        dag_job.shellcmd = f"bash scripts/run.sh {dag_job.jobid}"
+
+    graph = json.loads(_rendered_provenance(reporter))["@graph"]
+    assert reporter.job_index[0]["script"] == "scripts/run.sh"
+    with zipfile.ZipFile(f"ro-crate-metadata-{reporter.simulation_hash}.zip") as zf:
+        assert zf.namelist().count("scripts/run.sh") == 1
+    jobs = [node for node in graph if node["@id"].startswith("local:processing_step_")]
+    assert len(jobs) == 4
+    for job in jobs:
+        assert {"@id": "scripts/run.sh"} in job["has employed tool"]
+
+
+def test_sources_outside_the_workdir_are_skipped(make_reporter, tmp_path_factory):
+    shared = tmp_path_factory.mktemp("shared")
+    (shared / "plot.py").write_text("")
+    reporter = make_reporter(4)
+    for dag_job in reporter.dag._jobs:
+        if dag_job.rule.name == "generate":
+            dag_job.rule.script = "plot.py"
+            dag_job.rule.basedir = FakeSourceFile(shared)
+        else:
+            dag_job.shellcmd = f"python {shared / 'plot.py'}"
+    reporter.render()
+    assert reporter.job_index[0]["script"].startswith("..")
+    with zipfile.ZipFile(f"ro-crate-metadata-{reporter.simulation_hash}.zip") as zf:
+        names = zf.namelist()
+    assert not any(name.startswith(("..", "/")) or "plot.py" in name for name in names)
+
+
+def test_profile_writes_timing_summary(make_reporter, tmp_path, capsys):
+    script = tmp_path / "extractor.py"
+    script.write_text(PARAM_EXTRACTOR_SCRIPT)
+    summary_file = tmp_path / "profile.json"
+    stats_file = tmp_path / "profile.prof"
+    reporter = make_reporter(
+        10,
+        ReportSettings(
+            paramscript=script, profile=summary_file, profile_cprofile=stats_file
+        ),
+    )
+    reporter.render()
+
+    summary = json.loads(summary_file.read_text())
+    assert {"context", "dag_scan", "extraction", "jobs", "ttl_nodes", "zip"} <= set(
+        summary["phases"]
+    )
+    assert summary["phases"]["jobs"]["calls"] == 1
+    assert summary["extractor_rules"]["generate"]["calls"] == 9
+    assert summary["extractor_rules"]["simulate"]["calls"] == 10
+    assert summary["files"]["provenance.jsonld"]["size"] > 0
+    assert "Extractor rule" in capsys.readouterr().out
+    assert pstats.Stats(str(stats_file)).total_calls > 0
+
+
+def test_profile_disabled_by_default(make_reporter):
+    reporter = make_reporter(3)
+    reporter.render()
+    assert not reporter.profiler.enabled
+    assert reporter.profiler.phases == {}
+
+
+@pytest.mark.parametrize("shard", ["rule", "jobs"])
+def test_sharded_provenance_is_self_contained(make_reporter, tmp_path, shard):
+    script = tmp_path / "extractor.py"
+    script.write_text(PARAM_EXTRACTOR_SCRIPT)
+    reporter = make_reporter(
+        10, ReportSettings(paramscript=script, shard=shard, shard_jobs=3)
+    )
+    reporter.render()
+
+    crate = f"ro-crate-metadata-{reporter.simulation_hash}.zip"
+    with zipfile.ZipFile(crate) as zf:
+        names = set(zf.namelist())
+        assert "provenance.jsonld" not in names
+        index = json.loads(zf.read("provenance-index.jsonld"))
+        shard_files = [
+            node["@id"]
+            for node in index["@graph"]
+            if node["@type"] == "schema:MediaObject"
+        ]
+        assert len(shard_files) == (4 if shard == "rule" else 8)
+        assert set(shard_files) <= names
+        metadata = json.loads(zf.read("ro-crate-metadata.json"))
+        entities = {entity["@id"] for entity in metadata["@graph"]}
+        assert set(shard_files) <= entities
+
+        ids = set()
+        for name in shard_files:
+            if not name.endswith(".jsonld"):
+                continue
+            graph = json.loads(zf.read(name))["@graph"]
+            shard_ids = {node["@id"] for node in graph}
+            for node in graph:
+                refs = [node.get("part of"), node.get("represents")]
+                refs += node.get("has input", []) + node.get("has parameter", [])
+                assert all(ref["@id"] in shard_ids for ref in refs if ref)
+            ids |= shard_ids
+    # Same crate name, so the unsharded report replaces the sharded one.
+    reference = make_reporter(10, ReportSettings(paramscript=script))
+    full = json.loads(_rendered_provenance(reference))
+    assert reference.simulation_hash == reporter.simulation_hash
+    assert ids == {node["@id"] for node in full["@graph"]}
+
+
+def test_suspended_rule_shards_are_unchanged(make_reporter, tmp_path, monkeypatch):
+    script = tmp_path / "extractor.py"
+    script.write_text(PARAM_EXTRACTOR_SCRIPT)
+    settings = ReportSettings(
+        paramscript=script, shard="rule", formats=["jsonld", "ttl", "nt"]
+    )
+
+    def shard_files():
+        reporter = make_reporter(10, settings)
+        reporter.render()
+        crate = f"ro-crate-metadata-{reporter.simulation_hash}.zip"
+        with zipfile.ZipFile(crate) as zf:
+            return {
+                name: zf.read(name)
+                for name in zf.namelist()
+                if name.startswith("provenance")
+            }
+
+    expected = shard_files()
+    monkeypatch.setattr(plugin.shards, "MAX_OPEN_SHARDS", 1)
+    assert shard_files() == expected
+
+
+def test_shard_jobs_must_be_positive():
+    with pytest.raises(ValueError, match="shard-jobs"):
+        ReportSettings(shard="jobs", shard_jobs=0)
+
+
+def test_provenance_formats_and_gzip(make_reporter, tmp_path):
+    script = tmp_path / "extractor.py"
+    script.write_text(PARAM_EXTRACTOR_SCRIPT)
+    reference = make_reporter(5, ReportSettings(paramscript=script))
+    provenance = json.loads(_rendered_provenance(reference))
+
+    reporter = make_reporter(
+        5, ReportSettings(paramscript=script, formats=["nt", "nq"], gzip=True)
+    )
+    reporter.render()
+    assert reporter.simulation_hash == reference.simulation_hash
+
+    crate = f"ro-crate-metadata-{reporter.simulation_hash}.zip"
+    with zipfile.ZipFile(crate) as zf:
+        names = set(zf.namelist())
+        assert {"provenance.nt.gz", "provenance.nq.gz"} <= names
+        assert not {"provenance.jsonld", "provenance.ttl"} & names
+        assert zf.getinfo("provenance.nt.gz").compress_type == zipfile.ZIP_STORED
+        ntriples = gzip.decompress(zf.read("provenance.nt.gz")).decode()
+        metadata = json.loads(zf.read("ro-crate-metadata.json"))
+    local = f"https://local-domain.org/{reporter.simulation_hash}/"
+    job = next(node for node in provenance["@graph"] if "part of" in node)
+    job = job["@id"].replace("local:", local)
+    assert f"<{job}> " in ntriples
+    entities = {entity["@id"]: entity for entity in metadata["@graph"]}
+    assert entities["provenance.nt.gz"]["encodingFormat"] == "application/gzip"
+
+
+def test_store_collects_runs_for_queries(make_reporter, tmp_path_factory):
+    script = tmp_path_factory.mktemp("extractor") / "extractor.py"
+    script.write_text(PARAM_EXTRACTOR_SCRIPT)
+    path = tmp_path_factory.mktemp("store") / "provenance.sqlite"
+    settings = ReportSettings(paramscript=script, store=path)
+    small = make_reporter(5, settings)
+    small.render()
+    large = make_reporter(8, settings)
+    large.render()
+    # Reporting the same run again replaces it.
+    make_reporter(5, settings).render()
+
+    with ProvenanceStore(path) as store:
+        assert [run["run"] for run in store.find_runs("bucket")] == [
+            large.simulation_hash,
+            small.simulation_hash,
+        ]
+        runs = store.find_runs("bucket", 6, "units:m")
+        assert [run["run"] for run in runs] == [large.simulation_hash]
+        assert runs[0]["crate"].endswith(f"{large.simulation_hash}.zip")
+        assert store.find_runs("bucket", 6, "units:s") == []
+
+        jobs = store.find_jobs("bucket", 6)
+        assert [(job["run"], job["job"], job["rule"]) for job in jobs] == [
+            (large.simulation_hash, "local:processing_step_7", "simulate")
+        ]
+        assert len(store.rule_jobs("simulate")) == 2 + 4
+        sha256 = hashlib.sha256(b"{}").hexdigest()
+        files = store.find_files(sha256)
+        assert {(f["run"], f["path"]) for f in files} >= {
+            (small.simulation_hash, "file_4.json"),
+            (large.simulation_hash, "file_7.json"),
+        }
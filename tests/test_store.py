@@ -0,0 +1,42 @@
+from snakemake_report_plugin_metadat4ing.nodes import NodeIds, StepNode
+from snakemake_report_plugin_metadat4ing.store import ProvenanceStore
+
+
+def _add_steps(store, ids, labels):
+    for position, label in enumerate(labels):
+        store.add("steps", StepNode(ids.add(f"local:{label}"), label, position), ids)
+
+
+def test_concurrent_reports_do_not_lock_the_store(tmp_path):
+    path = tmp_path / "provenance.sqlite"
+    with ProvenanceStore(path) as first, ProvenanceStore(path) as second:
+        # The first report is still rendering while the second one finishes.
+        first.begin_run("/work/first")
+        _add_steps(first, NodeIds(), ["generate"])
+        second.db.execute("PRAGMA busy_timeout = 100")
+        second.begin_run("/work/second")
+        _add_steps(second, NodeIds(), ["simulate", "summary"])
+        second.finish("b" * 16)
+        _add_steps(first, NodeIds(), ["plot"])
+        first.finish("a" * 16)
+
+        rows = first.db.execute(
+            "SELECT runs.hash, steps.label FROM steps "
+            "JOIN runs ON runs.id = steps.run ORDER BY runs.hash, steps.position"
+        ).fetchall()
+    assert [tuple(row) for row in rows] == [
+        ("a" * 16, "generate"),
+        ("a" * 16, "plot"),
+        ("b" * 16, "simulate"),
+        ("b" * 16, "summary"),
+    ]
+
+
+def test_reporting_a_run_again_replaces_it(tmp_path):
+    with ProvenanceStore(tmp_path / "provenance.sqlite") as store:
+        for labels in (["generate", "simulate"], ["generate"]):
+            store.begin_run("/work")
+            _add_steps(store, NodeIds(), labels)
+            store.finish("a" * 16)
+        assert store.db.execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 1
+        assert store.db.execute("SELECT COUNT(*) FROM steps").fetchone()[0] == 1
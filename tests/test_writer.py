@@ -0,0 +1,60 @@
+import hashlib
+import io
+import json
+
+import pytest
+
+from snakemake_report_plugin_metadat4ing.writer import JsonLdGraphWriter
+
+CONTEXT = {"@vocab": "http://w3id.org/nfdi4ing/metadata4ing#", "units": "u:"}
+NODES = [
+    ("b", {"@id": "local:b", "label": "Größe", "has input": []}),
+    ("a", {"@id": "local:a", "part of": {"@id": "local:x"}, "value": 1.5}),
+    ("b", {"@id": "local:c", "list": [{"@id": "f"}, {"@id": "g"}]}),
+]
+
+
+def _write(nodes, compact):
+    with JsonLdGraphWriter(("a", "b", "c"), compact=compact) as writer:
+        for section, node in nodes:
+            writer.add(section, node)
+        f = io.StringIO()
+        writer.write(f, CONTEXT)
+        return f.getvalue(), writer.hexdigest(CONTEXT)
+
+
+@pytest.mark.parametrize("nodes", [NODES, []])
+@pytest.mark.parametrize("compact", [False, True])
+def test_writer_matches_json_dump(nodes, compact):
+    ordered = [node for key in "abc" for section, node in nodes if section == key]
+    document = {"@context": CONTEXT, "@graph": ordered}
+    text, digest = _write(nodes, compact)
+
+    if compact:
+        expected = json.dumps(document, ensure_ascii=False, separators=(",", ":"))
+    else:
+        expected = json.dumps(document, indent=4, ensure_ascii=False)
+    assert text == expected
+    node_sum = sum(
+        int.from_bytes(
+            hashlib.sha256(json.dumps(node, sort_keys=True).encode("utf-8")).digest(),
+            "big",
+        )
+        for node in ordered
+    ) % (1 << 256)
+    expected_digest = hashlib.sha256(
+        json.dumps(CONTEXT, sort_keys=True).encode("utf-8")
+        + len(ordered).to_bytes(8, "big")
+        + node_sum.to_bytes(32, "big")
+    ).hexdigest()
+    assert digest == expected_digest
+
+
+def test_digest_does_not_depend_on_node_order():
+    _, digest = _write(NODES, compact=False)
+    _, reversed_digest = _write(NODES[::-1], compact=True)
+    assert reversed_digest == digest
+    _, fewer_digest = _write(NODES[:2], compact=False)
+    assert fewer_digest != digest
+    _, repeated_digest = _write([*NODES, NODES[0]], compact=False)
+    assert repeated_digest != digest